@@ -0,0 +1,294 @@
+import json
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+from selenium.webdriver.common.by import By
+
+from easy_images.harvester import GoogleImagesHarvester, extract_image_urls
+
+
+def synthetic_image(seed, size=(256, 256)):
+
+    '''
+    Generate a deterministic synthetic image: smooth gradients plus noise, so it compresses
+    and hashes like a photo rather than like pure noise.
+
+    Parameters:
+    -----------
+        - seed (int): Seed of the image
+        - size (tuple): (width, height) of the image
+
+    Returns:
+    --------
+    Image (numpy array): BGR image
+    '''
+
+    width, height = size
+    generator = np.random.default_rng(seed)
+
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [np.sin(x / generator.uniform(8, 64) + generator.uniform(0, 6)) +
+                np.cos(y / generator.uniform(8, 64) + generator.uniform(0, 6)) for _ in range(3)]
+    image = (np.stack(channels, axis=-1) + 2) * 60 + generator.normal(0, 8, (height, width, 3))
+
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def encode_image(image, file_format='.jpg'):
+
+    return cv2.imencode(file_format, image)[1].tobytes()
+
+
+def make_image_dir(image_dir, count, size=(256, 256), duplicate_rate=0.1, seed=0):
+
+    '''
+    Fill a directory with synthetic JPEG images, a share of which are exact or re-encoded
+    (near) duplicates of earlier ones. Existing directories with the right number of images
+    are reused, as generating 100k images takes a while.
+
+    Parameters:
+    -----------
+        - image_dir (str): Path of the directory
+        - count (int): Number of images
+        - size (tuple): (width, height) of the images
+        - duplicate_rate (float): Share of the images which duplicate an earlier one
+        - seed (int): Seed of the dataset
+
+    Returns:
+    --------
+    image_dir (str): Path of the directory
+    '''
+
+    if os.path.isdir(image_dir) and len(os.listdir(image_dir)) == count:
+        return image_dir
+
+    os.makedirs(image_dir, exist_ok=True)
+    generator = random.Random(seed)
+    # A pool of base images keeps generation fast, variants are made by cheap pixel shifts
+    base_images = [synthetic_image(seed * 1000 + index, size) for index in range(min(count, 64))]
+
+    for index in range(count):
+        if index and generator.random() < duplicate_rate:
+            image = cv2.imread(os.path.join(image_dir, 'image_{}.jpg'.format(generator.randrange(index))))
+            quality = generator.choice([95, 80])
+        else:
+            image = np.roll(base_images[index % len(base_images)], shift=(index // len(base_images)) * 7, axis=(0, 1))
+            quality = 90
+
+        cv2.imwrite(os.path.join(image_dir, 'image_{}.jpg'.format(index)), image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+
+    return image_dir
+
+
+class ImageServer:
+
+    def __init__(self, latency=0.0, error_rate=0.0, html_rate=0.0, size=(256, 256), seed=0):
+
+        '''
+        Local HTTP server serving synthetic images, for offline download benchmarks.
+        /image/<n>.jpg and /image/<n>.png return image n, after the given latency. A share of
+        the requests fails with a 503 and a share returns an html page instead of an image.
+
+        Parameters:
+        -----------
+            - latency (float): Seconds to wait before every response
+            - error_rate (float): Share of the requests answered with 503
+            - html_rate (float): Share of the requests answered with an html page
+            - size (tuple): (width, height) of the images
+            - seed (int): Seed of the images and of the failures
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.html_rate = html_rate
+        self.size = size
+        self.seed = seed
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def _response(self, path):
+
+        '''
+        Status, content type and body of a request path.
+        '''
+
+        name = os.path.basename(path)
+        stem, file_format = os.path.splitext(name)
+        if not stem.isdigit() or file_format not in ('.jpg', '.png'):
+            return 404, 'text/plain', b'not found'
+
+        # Failures are decided per url, so retries of a failing url fail again
+        outcome = random.Random('{}-{}'.format(self.seed, name)).random()
+        if outcome < self.error_rate:
+            return 503, 'text/plain', b'unavailable'
+        if outcome < self.error_rate + self.html_rate:
+            return 200, 'text/html', b'<html><body>Not an image</body></html>'
+
+        with self.lock:
+            body = self.cache.get(name)
+        if body is None:
+            body = encode_image(synthetic_image(self.seed * 100000 + int(stem), self.size), file_format)
+            with self.lock:
+                self.cache[name] = body
+
+        return 200, 'image/jpeg' if file_format == '.jpg' else 'image/png', body
+
+    def start(self):
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency: threading.Event().wait(server.latency)
+                status, content_type, body = server._response(self.path.split('?')[0])
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def url(self, number, file_format='.jpg'):
+
+        return 'http://127.0.0.1:{}/image/{}{}'.format(self.server.server_address[1], number, file_format)
+
+    def stop(self):
+
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.stop()
+
+
+def make_result_page(image_urls):
+
+    '''
+    Build a Google Images like result page, with the full image urls in the embedded page data
+    as extract_image_urls expects them.
+
+    Parameters:
+    -----------
+        - image_urls (list): Image urls of the page
+
+    Returns:
+    --------
+    HTML (str): Page source
+    '''
+
+    data = ','.join('[{},{},{}]'.format(json.dumps(image_url), 600, 800) for image_url in image_urls)
+
+    return '<html><body><div id="{}"></div><script>AF_initDataCallback({{data:[{}]}});</script></body></html>'.format(
+        GoogleImagesHarvester.SCROLL_ELEMENT_ID, data)
+
+
+class FakeElement:
+
+    def __init__(self, driver, index=None):
+
+        self.driver = driver
+        self.index = index
+
+    def click(self):
+
+        self.driver.selected = self.index
+
+    def send_keys(self, *keys):
+
+        # Scrolling loads the next page of thumbnails
+        self.driver.loaded = min(len(self.driver.image_urls), self.driver.loaded + self.driver.page_size)
+
+    def get_attribute(self, name):
+
+        return self.driver.image_urls[self.driver.selected]
+
+    def is_displayed(self):
+
+        return False
+
+
+class FakeDriver:
+
+    def __init__(self, page_source, image_urls=None, page_size=100):
+
+        '''
+        Fake WebDriver replaying a saved result page, with the part of the WebDriver API used by
+        GoogleImagesHarvester. Thumbnails are loaded page_size at a time, on every scroll; a
+        clicked thumbnail previews its image url.
+
+        Parameters:
+        -----------
+            - page_source (str): Saved result page
+            - image_urls (list): Urls previewed by the thumbnails, in order. Defaults to the urls of the page data.
+            - page_size (int): Number of thumbnails loaded per scroll
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.page_source = page_source
+        self.image_urls = image_urls if image_urls is not None else extract_image_urls(page_source)
+        self.page_size = page_size
+        self.loaded = 0
+        self.selected = None
+        self.current_url = 'about:blank'
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+
+        with open(path) as file:
+            return cls(file.read(), **kwargs)
+
+    def get(self, url):
+
+        self.current_url = url
+        self.loaded = min(len(self.image_urls), self.page_size)
+        self.selected = None
+
+    def find_element(self, by, value):
+
+        return FakeElement(self)
+
+    def find_elements(self, by, value):
+
+        if value == GoogleImagesHarvester.THUMBNAIL_SELECTOR:
+            return [FakeElement(self, index) for index in range(self.loaded)]
+        if value == GoogleImagesHarvester.PREVIEW_SELECTOR and by == By.CSS_SELECTOR:
+            return [FakeElement(self)] if self.selected is not None else []
+        return []
+
+    def quit(self):
+
+        pass
+
+    def close(self):
+
+        pass
@@ -0,0 +1,112 @@
+'''
+Startup cost of easy_images: import time and the modules loaded by a fresh process.
+
+    python -m benchmarks.imports --max-ms 400
+
+Every scenario runs in fresh interpreters. Post processing processes must never load the download
+dependencies (Selenium, webdriver_manager, requests, libmagic, tabulate), and the import must stay
+under --max-ms. A violation is reported and the exit code is 1.
+'''
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from tabulate import tabulate
+
+from benchmarks.fixtures import make_image_dir
+
+DOWNLOAD_MODULES = ('selenium', 'webdriver_manager', 'requests', 'urllib3', 'magic', 'tabulate')
+
+SCENARIOS = {
+    'import': '',
+    'construct': 'EasyImages()',
+    'post_processing': 'EasyImages().post_processing({image_dir!r}, remove_duplicates=True, resize=(32, 32), avg_image_size=True)',
+}
+
+SCRIPT = '''
+import json, sys, time
+start_time = time.perf_counter()
+from easy_images.easy_images import EasyImages
+import_seconds = time.perf_counter() - start_time
+{statement}
+print(json.dumps({{'import_seconds': import_seconds, 'modules': sorted(set(name.split('.')[0] for name in sys.modules))}}))
+'''
+
+
+def run_scenario(statement, repeat=5):
+
+    '''
+    Run a scenario in fresh interpreters.
+
+    Parameters:
+    -----------
+        - statement (str): Python statement run after importing EasyImages
+        - repeat (int): Number of fresh interpreters
+
+    Returns:
+    --------
+    (import_ms, modules) (tuple): Median import time in milliseconds and the top-level modules loaded at the end
+    '''
+
+    environment = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [root, environment.get('PYTHONPATH')]))
+
+    import_seconds = []
+    modules = set()
+
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', SCRIPT.format(statement=statement)], env=environment,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, cwd=tempfile.gettempdir())
+        result = json.loads(output.stdout.decode('utf-8').strip().splitlines()[-1])
+        import_seconds.append(result['import_seconds'])
+        modules.update(result['modules'])
+
+    return float(np.median(import_seconds)) * 1000, modules
+
+
+def main(arguments=None):
+
+    parser = argparse.ArgumentParser(description='Startup cost of easy_images')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per scenario')
+    parser.add_argument('--max-ms', type=float, help='Maximum median import time in milliseconds')
+    args = parser.parse_args(arguments)
+
+    image_dir = tempfile.mkdtemp(prefix='easy_images_imports_')
+    rows = []
+    violations = []
+
+    try:
+        make_image_dir(image_dir, 8, size=(64, 64))
+
+        for name, statement in SCENARIOS.items():
+            print('[INFO] Running {}'.format(name), file=sys.stderr)
+            import_ms, modules = run_scenario(statement.format(image_dir=image_dir), args.repeat)
+            loaded = sorted(module for module in DOWNLOAD_MODULES if module in modules)
+            rows.append([name, import_ms, ', '.join(loaded) or '-'])
+
+            if loaded:
+                violations.append('{} loads {}'.format(name, ', '.join(loaded)))
+            if args.max_ms is not None and name == 'import' and import_ms > args.max_ms:
+                violations.append('import takes {:.1f} ms, more than {} ms'.format(import_ms, args.max_ms))
+
+    finally:
+        shutil.rmtree(image_dir, ignore_errors=True)
+
+    print(tabulate(rows, headers=['Scenario', 'Import ms', 'Download modules loaded'], floatfmt='.1f'))
+
+    if violations:
+        print('\n[ERROR] {}'.format('\n[ERROR] '.join(violations)))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
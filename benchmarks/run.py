@@ -0,0 +1,349 @@
+'''
+Offline benchmarks of the download and post processing hot paths.
+
+    python -m benchmarks.run --sizes 1000,10000 --save-baseline baseline.json
+    python -m benchmarks.run --sizes 1000,10000 --baseline baseline.json
+
+Every stage reports its throughput, per-item latency percentiles and peak traced memory. The
+harvest stage replays the result pages of tests/fixtures through the fake browser. With --baseline, stages slower (or using more memory) than the
+baseline by more than --tolerance are reported as regressions and the exit code is 1.
+'''
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from functools import partial
+
+import cv2
+import numpy as np
+from tabulate import tabulate
+
+from benchmarks.fixtures import FakeDriver, ImageServer, make_image_dir, make_result_page
+from easy_images.easy_images import EasyImages
+
+STAGES = ('harvest', 'download', 'generate_hash', 'remove_duplicates', 'resize_and_save')
+PERCENTILES = (50, 95, 99)
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'fixtures')
+
+
+def measure(function, repeat=3, trace_memory=True):
+
+    '''
+    Run a benchmark function repeat times, plus once under tracemalloc for the peak memory (tracing
+    slows Python code down, so it is kept out of the timed runs).
+
+    Parameters:
+    -----------
+        - function (callable): Function without arguments returning (number of items, per-item latencies or None). Its
+          optional setup attribute is called before every run, outside of the timing.
+        - repeat (int): Number of timed runs
+        - trace_memory (boolean): Whether to measure the peak memory
+
+    Returns:
+    --------
+    Result (dict): Items, median seconds, throughput, latency percentiles (ms) and peak memory (MB)
+    '''
+
+    durations = []
+    latencies = []
+    items = 0
+    setup = getattr(function, 'setup', lambda: None)
+
+    for _ in range(repeat):
+        setup()
+        start_time = time.perf_counter()
+        items, run_latencies = function()
+        durations.append(time.perf_counter() - start_time)
+        latencies.extend(run_latencies or [])
+
+    peak_memory = None
+    if trace_memory:
+        setup()
+        tracemalloc.start()
+        try:
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+
+    seconds = float(np.median(durations))
+    result = {'items': items, 'seconds': seconds, 'throughput': items / seconds if seconds else float('inf'),
+              'peak_memory_mb': peak_memory}
+
+    for percentile in PERCENTILES:
+        result['p{}_ms'.format(percentile)] = float(np.percentile(latencies, percentile)) * 1000 if latencies else None
+
+    return result
+
+
+def time_items(function, image_paths, **kwargs):
+
+    '''
+    Chunk function (see EasyImages._map_images) running a chunk function image by image, and adding
+    the seconds of every image to its value. Module level, so it can be sent to worker processes.
+    '''
+
+    results = []
+
+    for image_path in image_paths:
+        start_time = time.perf_counter()
+        image_results = function([image_path], **kwargs)
+        seconds = time.perf_counter() - start_time
+        results.extend((path, (value, seconds), error) for path, value, error in image_results)
+
+    return results
+
+
+def bench_harvest(extraction, pages_per_fixture):
+
+    '''
+    Url harvesting of the result page fixtures, replayed by a fake browser, timing every page.
+    '''
+
+    easy_images = EasyImages(loading_timeout=0.2)
+    page_paths = sorted(os.path.join(FIXTURE_DIR, name) for name in os.listdir(FIXTURE_DIR) if name.endswith('.html'))
+
+    def run():
+        latencies = []
+        number_of_urls = 0
+
+        for page_path in page_paths * pages_per_fixture:
+            driver = FakeDriver.from_file(page_path)
+            harvester = easy_images._create_harvester(driver, extraction)
+            # A scroll target the page covers, so no wait times out; the open stop event lets every url through
+            max_limit = max(1, int((len(driver.image_urls) - 1) / easy_images.URL_SURPLUS_FACTOR))
+
+            start_time = time.perf_counter()
+            number_of_urls += len(list(harvester.iter_image_urls('https://www.google.com/search?q=benchmark', 'benchmark',
+                                                                  max_limit, threading.Event())))
+            latencies.append(time.perf_counter() - start_time)
+
+        return number_of_urls, latencies
+
+    return run
+
+
+def bench_download(work_dir, number_of_images, latency, error_rate, html_rate, max_workers):
+
+    '''
+    download() of one keyword against the local image server, with a fake browser replaying a
+    result page, from page loading to the last accepted image.
+    '''
+
+    server = ImageServer(latency=latency, error_rate=error_rate, html_rate=html_rate).start()
+    page_source = make_result_page([server.url(number) for number in range(int(number_of_images * 2) + 10)])
+    output_dir = os.path.join(work_dir, 'download')
+
+    def setup():
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    def run():
+        easy_images = EasyImages(driver_factory=lambda: FakeDriver(page_source), loading_timeout=0.2)
+        latencies = []
+        fetch_image = easy_images._fetch_image
+
+        def timed_fetch_image(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return fetch_image(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start_time)
+
+        easy_images._fetch_image = timed_fetch_image
+
+        stats = easy_images.download('benchmark', output_dir=output_dir, max_limit=number_of_images, max_workers=max_workers,
+                                     url_extraction='page_data', remove_duplicates=True, verbose=False)
+
+        return stats['Downloaded'], latencies
+
+    run.setup = setup
+    run.server = server
+    return run
+
+
+def bench_generate_hash(image_dir):
+
+    '''
+    _generate_hash over the images of a dataset, timing every call. Decoding is not timed.
+    '''
+
+    easy_images = EasyImages()
+    image_paths = easy_images._list_images(image_dir)
+
+    def run():
+        latencies = []
+        for image_path in image_paths:
+            image = cv2.imread(image_path)
+            start_time = time.perf_counter()
+            easy_images._generate_hash(image)
+            latencies.append(time.perf_counter() - start_time)
+        return len(image_paths), latencies
+
+    return run
+
+
+def bench_directory(image_dir, work_dir, method, **kwargs):
+
+    '''
+    A directory operation of EasyImages over a fresh copy of a dataset, timing every image in the
+    chunk functions (in the worker processes, if any). Copying is not timed.
+    '''
+
+    easy_images = EasyImages()
+    copy_dir = os.path.join(work_dir, method)
+    number_of_images = len(os.listdir(image_dir))
+    map_images = easy_images._map_images
+    latencies = []
+
+    def timed_map_images(function, image_paths, *args, **kwargs):
+        for image_path, (value, seconds) in map_images(partial(time_items, function), image_paths, *args, **kwargs):
+            latencies.append(seconds)
+            yield image_path, value
+
+    easy_images._map_images = timed_map_images
+
+    def setup():
+        shutil.rmtree(copy_dir, ignore_errors=True)
+        shutil.copytree(image_dir, copy_dir)
+
+    def run():
+        del latencies[:]
+        getattr(easy_images, method)(copy_dir, **kwargs)
+        return number_of_images, list(latencies)
+
+    run.setup = setup
+    return run
+
+
+def compare(results, baseline, tolerance):
+
+    '''
+    Compare the results with a baseline.
+
+    Parameters:
+    -----------
+        - results (dict): Results of this run, by benchmark name
+        - baseline (dict): Results of the baseline, by benchmark name
+        - tolerance (float): Allowed relative slowdown (or memory growth), e.g. 0.15
+
+    Returns:
+    --------
+    (rows, regressions) (tuple): Table rows and names of the regressed benchmarks
+    '''
+
+    rows = []
+    regressions = []
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append([name, result['throughput'], None, None, 'new'])
+            continue
+
+        change = result['throughput'] / base['throughput'] - 1 if base['throughput'] else 0.0
+        status = 'ok'
+        if change < -tolerance:
+            status = 'SLOWER'
+        elif result['peak_memory_mb'] and base.get('peak_memory_mb') and result['peak_memory_mb'] > base['peak_memory_mb'] * (1 + tolerance):
+            status = 'MORE MEMORY'
+
+        if status != 'ok': regressions.append(name)
+        rows.append([name, result['throughput'], base['throughput'], '{:+.1%}'.format(change), status])
+
+    return rows, regressions
+
+
+def main(arguments=None):
+
+    parser = argparse.ArgumentParser(description='Offline benchmarks of easy_images')
+    parser.add_argument('--stages', default=','.join(STAGES), help='Comma separated stages, of {}'.format(', '.join(STAGES)))
+    parser.add_argument('--sizes', default='1000', help='Comma separated dataset sizes, e.g. 1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes of the directory operations')
+    parser.add_argument('--harvest-pages', type=int, default=100, help='Replays of every result page fixture by the harvest benchmark')
+    parser.add_argument('--download-images', type=int, default=200, help='Images downloaded by the download benchmark')
+    parser.add_argument('--download-workers', type=int, default=8, help='max_workers of the download benchmark')
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds of latency of the image server')
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Share of image requests failing with 503')
+    parser.add_argument('--html-rate', type=float, default=0.05, help='Share of image requests returning html')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'easy_images_benchmarks'),
+                        help='Directory of the generated datasets, reused across runs')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the peak memory run')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--save-baseline', help='Write the results as the baseline to this file')
+    parser.add_argument('--baseline', help='Compare the results with the baseline of this file')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative regression against the baseline')
+    args = parser.parse_args(arguments)
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown_stages = set(stages) - set(STAGES)
+    if unknown_stages: parser.error('Unknown stages: {}'.format(', '.join(sorted(unknown_stages))))
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    work_dir = tempfile.mkdtemp(prefix='easy_images_benchmark_')
+    results = {}
+
+    def run_benchmark(name, benchmark):
+        print('[INFO] Running {}'.format(name), file=sys.stderr)
+        results[name] = measure(benchmark, args.repeat, not args.no_memory)
+
+    try:
+        if 'harvest' in stages:
+            for extraction in ('page_data', 'click'):
+                run_benchmark('harvest_{}/{}'.format(extraction, args.harvest_pages), bench_harvest(extraction, args.harvest_pages))
+
+        if 'download' in stages:
+            benchmark = bench_download(work_dir, args.download_images, args.latency, args.error_rate, args.html_rate,
+                                       args.download_workers)
+            try:
+                run_benchmark('download/{}'.format(args.download_images), benchmark)
+            finally:
+                benchmark.server.stop()
+
+        for size in sizes:
+            image_dir = make_image_dir(os.path.join(args.data_dir, 'images_{}'.format(size)), size)
+
+            if 'generate_hash' in stages:
+                run_benchmark('generate_hash/{}'.format(size), bench_generate_hash(image_dir))
+            if 'remove_duplicates' in stages:
+                run_benchmark('remove_duplicates/{}'.format(size), bench_directory(image_dir, work_dir, 'remove_duplicates',
+                              max_distance=4, workers=args.workers))
+            if 'resize_and_save' in stages:
+                run_benchmark('resize_and_save/{}'.format(size), bench_directory(image_dir, work_dir, 'resize_and_save',
+                              size=(128, 128), workers=args.workers))
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    headers = ['Benchmark', 'Items', 'Seconds', 'Items/s'] + ['P{} ms'.format(percentile) for percentile in PERCENTILES] + ['Peak MB']
+    print(tabulate([[name, result['items'], result['seconds'], result['throughput']] +
+                    [result['p{}_ms'.format(percentile)] for percentile in PERCENTILES] + [result['peak_memory_mb']]
+                    for name, result in results.items()], headers=headers, floatfmt='.3f', missingval='-'))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            rows, regressions = compare(results, json.load(file), args.tolerance)
+
+        print()
+        print(tabulate(rows, headers=['Benchmark', 'Items/s', 'Baseline items/s', 'Change', 'Status'], floatfmt='.3f', missingval='-'))
+
+        if regressions:
+            print('\n[ERROR] Regressions: {}'.format(', '.join(regressions)))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,8 @@
 from __future__ import absolute_import
 
+import logging
+
 __version__ = '0.0.6.2'
+
+# Library logging is silent unless the application configures it
+logging.getLogger(__name__).addHandler(logging.NullHandler())
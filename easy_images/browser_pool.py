@@ -0,0 +1,125 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class BrowserPool:
+
+    def __init__(self, driver_factory, size=1, health_check=None, logger=None):
+
+        '''
+        Bounded pool of WebDriver instances shared by the keyword workers. Drivers are created
+        lazily by the factory, at most size of them exist at the same time, and a driver whose
+        keyword failed is quit and replaced by a new one on the next acquire. An idle driver
+        which fails the health check (e.g. the browser died between two downloads) is
+        replaced as well.
+
+        Parameters:
+        -----------
+            - driver_factory (callable): Function without arguments returning a new WebDriver (or a compatible fake)
+            - size (int): Maximum number of drivers
+            - health_check (callable): Function taking a driver and returning whether it still works, None to skip the check
+            - logger (Logger): Logger for the errors
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.driver_factory = driver_factory
+        self.size = max(1, int(size))
+        self.health_check = health_check
+        self.restarts = 0
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.idle_drivers = []
+        self.all_drivers = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(self.size)
+
+    @contextmanager
+    def acquire(self):
+
+        '''
+        Borrow a driver for the duration of a with block. If the block raises, the driver is
+        discarded instead of going back to the pool, as its state is unknown.
+
+        Returns:
+        --------
+        Driver (WebDriver): A driver which no other worker uses until the block ends
+        '''
+
+        self.slots.acquire()
+
+        try:
+            with self.lock:
+                driver = self.idle_drivers.pop() if self.idle_drivers else None
+
+            if driver is not None and self.health_check is not None and not self.health_check(driver):
+                self.logger.error("[ERROR] Browser is not responding, restarting it.")
+                self._discard(driver)
+                self.restarts += 1
+                driver = None
+
+            if driver is None:
+                driver = self.driver_factory()
+                with self.lock:
+                    self.all_drivers.append(driver)
+
+            # Only errors discard the driver, not e.g. a generator closed inside the block
+            try:
+                yield driver
+            except Exception:
+                self._discard(driver)
+                raise
+            except BaseException:
+                with self.lock:
+                    self.idle_drivers.append(driver)
+                raise
+            else:
+                with self.lock:
+                    self.idle_drivers.append(driver)
+
+        finally:
+            self.slots.release()
+
+    def _discard(self, driver):
+
+        '''
+        Quit a driver and forget it.
+
+        Parameters:
+        -----------
+            - driver (WebDriver): Driver to quit
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self.lock:
+            if driver in self.all_drivers: self.all_drivers.remove(driver)
+
+        try:
+            driver.quit()
+        except Exception as e:
+            self.logger.error("[ERROR] %s", e)
+
+    def close(self):
+
+        '''
+        Quit all the drivers of the pool.
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self.lock:
+            drivers, self.all_drivers, self.idle_drivers = self.all_drivers, [], []
+
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception as e:
+                self.logger.error("[ERROR] %s", e)
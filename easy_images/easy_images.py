@@ -1,28 +1,48 @@
+import hashlib
+import json
 import logging
 import os
+import queue
+import shutil
+import threading
 import time
+import uuid
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing
 from datetime import datetime
+from functools import partial
 from importlib.resources import path
 from urllib.parse import quote
 
-import bs4
 import cv2
-import magic
 import numpy as np
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from tabulate import tabulate
 from tqdm import tqdm
-from webdriver_manager.chrome import ChromeDriverManager
+
+# Selenium, webdriver_manager, requests, libmagic and tabulate are only needed to download, they are
+# imported by the download code paths so that post processing processes start fast and lean
+
+from easy_images import hashing, workers as image_workers
+from easy_images.browser_pool import BrowserPool
+from easy_images.hash_index import HashIndex, cluster_hashes
+from easy_images.hash_store import HashStore
+from easy_images.image_info import ImageSizeStats, read_image_header
+from easy_images.manifest import Manifest
+from easy_images.shards import ImageArrayWriter, ShardReader, ShardWriter, is_shard_dir
+from easy_images.stages import Grayscale, Resize
+from easy_images.stats import FetchError, RunStats, failure_reason
+from easy_images.url_cache import UrlCache
+
+# Options of one download() or iter_images() call. They are passed down to the worker threads instead
+# of being set on the object, so concurrent calls on the same object do not change each other's options.
+DownloadOptions = namedtuple('DownloadOptions', ['output_dir', 'image_formats', 'max_bytes', 'hash_type', 'hash_size',
+                                                 'max_distance', 'url_extraction'])
 
 
 class EasyImages:
 
-    def __init__(self, browser_name='chrome', headless=True, loading_timeout=2):
+    def __init__(self, browser_name='chrome', headless=True, loading_timeout=2, connect_timeout=1, read_timeout=1,
+                 retries=2, backoff_factor=0.3, max_connections_per_host=8, driver_factory=None, log_file=None, hooks=None):
 
         '''
         Intialized all the necessary variables and constants while creating the class object.
@@ -31,34 +51,58 @@ class EasyImages:
         -----------
             - browser_name (str): Browser name of the user
             - headless (boolean): While downloading, whether to run browser or not. Set headless=False to open browser.
-            - loading_timeout (float): Page loading timeout. Less for fast and more for slow internet.
+            - loading_timeout (float): Maximum time to wait for the page or new thumbnails to load. Waits end as soon as the page is ready.
+            - connect_timeout (float): Seconds to wait for a connection to an image host.
+            - read_timeout (float): Seconds to wait for an image host to send data.
+            - retries (int): Number of retries with exponential backoff for transient download errors.
+            - backoff_factor (float): Backoff factor between retries (0.3 -> 0.3s, 0.6s, 1.2s ...).
+            - max_connections_per_host (int): Maximum number of open connections to a single image host.
+            - driver_factory (callable): Function without arguments returning a new WebDriver (or a compatible fake). Defaults to a Chrome (or Brave) driver as per browser_name and headless.
+            - log_file (str): Path of a log file for the easy_images loggers, e.g. "easyimages.log". By default nothing is logged unless the application configures logging.
+            - hooks (list): Callables hook(event, data) called with the stats events of every run, e.g. to export metrics (see easy_images.stats.RunStats)
 
         Returns:
         --------
         None
         '''
 
-        log_filename = "easyimages.log"
-        logging.basicConfig(filename=log_filename,
-                    format='%(asctime)s %(message)s',
-                    filemode='a')
-
-        self.logger = logging.getLogger()
-        self.logger.setLevel(logging.DEBUG)
+        # Library logger: silent (and cheap) unless the application configures logging or log_file is given
+        self.logger = logging.getLogger(__name__)
+        if log_file: self._add_log_file(log_file)
+        self.hooks = list(hooks or [])
 
         self.BROWSER_FILE_PATH = '/usr/bin/brave-browser'
         self.BROWSER_NAME = 'brave'
         self.browser_name = browser_name
         self.headless = headless
+        self.driver_factory = driver_factory or self._create_browser
+        self.DRIVER_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'easy_images', 'driver.json')
+        self.driver_path = None
+        self.driver_path_lock = threading.Lock()
+        self.browser_pool = None
         self.MAX_SCROLL_NUMBER = 160
-        self.MIN_SCROLL_NUMBER = 0
-        self.IMAGES_PER_SCROLL = 25
-        self.SCROLL_SIMILARITY = 2
-        self.IMAGES_PER_HALF_PAGE = 350
         self.PAGE_LOADING_TIMEOUT = loading_timeout
-        self.SCROLLING_TIMEOUT_FACTOR = 40
-        self.PAGE_SCROLLING_TIMEOUT = self.PAGE_LOADING_TIMEOUT / self.SCROLLING_TIMEOUT_FACTOR
-        self.UTILITY_FUNCTIONS_TIMEOUT = 0.01
+        self.PREVIEW_TIMEOUT = self.PAGE_LOADING_TIMEOUT / 4
+        self.PAGE_POLL_INTERVAL = 0.05
+        self.URL_SURPLUS_FACTOR = 1.5
+        self.URL_QUEUE_SIZE = 64
+        self.URL_CACHE_MAX_ENTRIES = 1000
+        self.IMAGE_CHUNK_SIZE = 64
+        self.DOWNLOAD_WINDOW_FACTOR = 2
+        self.DOWNLOAD_CHUNK_SIZE = 16 * 1024
+        self.MIME_SNIFF_SIZE = 4 * 1024
+        self.PART_FILE_SUFFIX = '.part'
+        self.IMAGE_FILE_FORMATS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+
+        # The libmagic cookie and the http session are created by the first download (see _open_download_resources)
+        self.mime = None
+        self.http_session = None
+        self.http_session_options = {'max_connections_per_host': max_connections_per_host, 'retries': retries,
+            'backoff_factor': backoff_factor, 'connect_timeout': connect_timeout, 'read_timeout': read_timeout}
+        self.download_resources_lock = threading.Lock()
+
+        # Guards the hash index shared by the keywords when duplicates are removed across the output directory
+        self.hash_index_lock = threading.Lock()
 
         self.PRINT_FORMAT = {"LINE": {"SYMBOL": "#", "LENGTH": 80},
                              "1_NEWLINE": "\n",
@@ -66,7 +110,188 @@ class EasyImages:
 
         self.logger.info("[INFO] Initialized all the variables.")
 
-    def _make_directory(self, keyword):
+    def _add_log_file(self, log_file):
+
+        '''
+        Log the easy_images loggers (DEBUG and above) to a file. The handler is added once per file.
+
+        Parameters:
+        -----------
+            - log_file (str): Path of the log file
+
+        Returns:
+        --------
+        None
+        '''
+
+        package_logger = logging.getLogger(__name__.split('.')[0])
+        log_path = os.path.abspath(log_file)
+
+        if not any(getattr(handler, 'baseFilename', None) == log_path for handler in package_logger.handlers):
+            handler = logging.FileHandler(log_path, mode='a')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            package_logger.addHandler(handler)
+
+        package_logger.setLevel(logging.DEBUG)
+
+    def open(self, browsers=1):
+
+        '''
+        Start a long-lived session: the browsers are kept open across download() calls instead of
+        being started and closed by every call. Also available as a context manager
+        (with EasyImages() as easy_response: ...).
+
+        Parameters:
+        -----------
+            - browsers (int): Number of browsers of the session, i.e. of keywords processed concurrently
+
+        Returns:
+        --------
+        self (EasyImages): The object itself
+        '''
+
+        if self.browser_pool is None:
+            self.browser_pool = BrowserPool(self.driver_factory, browsers, health_check=self._browser_alive, logger=self.logger)
+            self.logger.info("[INFO] Opened a session with %s browser(s).", self.browser_pool.size)
+
+        return self
+
+    def close(self):
+
+        '''
+        Close the browsers of the session opened by open().
+
+        Returns:
+        --------
+        None
+        '''
+
+        if self.browser_pool is not None:
+            self.browser_pool.close()
+            self.browser_pool = None
+            self.logger.info("[INFO] Closed the session.")
+
+    def __enter__(self):
+
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    def _browser_alive(self, browser):
+
+        '''
+        Health check of a browser: a dead browser (or driver) fails to answer any command.
+
+        Parameters:
+        -----------
+            - browser (WebDriver): Browser to check
+
+        Returns:
+        --------
+        Alive (boolean): Whether the browser still answers
+        '''
+
+        try:
+            browser.current_url
+            return True
+        except Exception:
+            return False
+
+    def _open_download_resources(self):
+
+        '''
+        Create the libmagic cookie and the pooled http session on first use. Both are kept for the
+        lifetime of the object: the libmagic cookie is expensive to open (it is guarded by its own
+        lock), and the session keeps its connections alive across download() calls.
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self.download_resources_lock:
+            if self.mime is None:
+                import magic
+                self.mime = magic.Magic(mime=True)
+
+            if self.http_session is None:
+                from easy_images.http_session import PooledSession
+                self.http_session = PooledSession(**self.http_session_options)
+
+    def _driver_path(self, refresh=False):
+
+        '''
+        Path of the driver binary. ChromeDriverManager is only asked once, the resolved path is
+        cached in memory and on disk (DRIVER_CACHE_PATH) for the next processes.
+
+        Parameters:
+        -----------
+            - refresh (boolean): Whether to resolve the path again, e.g. when the cached driver does not start
+
+        Returns:
+        --------
+        Driver path (str): Path of the driver binary
+        '''
+
+        with self.driver_path_lock:
+
+            if refresh:
+                self.driver_path = None
+
+            elif self.driver_path is None:
+                try:
+                    with open(self.DRIVER_CACHE_PATH) as cache_file:
+                        driver_path = json.load(cache_file).get('chromedriver')
+                    if driver_path and os.access(driver_path, os.X_OK):
+                        self.driver_path = driver_path
+                except (OSError, ValueError):
+                    pass
+
+            if self.driver_path is None:
+                from webdriver_manager.chrome import ChromeDriverManager
+                self.driver_path = ChromeDriverManager().install()
+
+                try:
+                    os.makedirs(os.path.dirname(self.DRIVER_CACHE_PATH), exist_ok=True)
+                    temp_path = "{}.{}.tmp".format(self.DRIVER_CACHE_PATH, uuid.uuid4().hex)
+                    with open(temp_path, 'w') as cache_file:
+                        json.dump({'chromedriver': self.driver_path}, cache_file)
+                    os.replace(temp_path, self.DRIVER_CACHE_PATH)
+                except OSError as e:
+                    self.logger.error("[ERROR] %s", e)
+
+            return self.driver_path
+
+    def _create_browser(self):
+
+        '''
+        Create a new browser as per the browser name and headless settings.
+
+        Returns:
+        --------
+        Browser (WebDriver): Chrome (or Brave) WebDriver
+        '''
+
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+
+        option = Options()
+        if self.headless: option.add_argument("--headless")
+
+        if self.browser_name == self.BROWSER_NAME:
+            option.binary_location = self.BROWSER_FILE_PATH
+
+        try:
+            return webdriver.Chrome(options = option, service = Service(self._driver_path()))
+        except Exception as e:
+            # The cached driver may not match an updated browser, resolve it again once
+            self.logger.error("[ERROR] %s", e)
+            return webdriver.Chrome(options = option, service = Service(self._driver_path(refresh=True)))
+
+    def _make_directory(self, output_dir, keyword):
 
         '''
         Create directory for the given keyword inside the main output directory. If not already,
@@ -74,6 +299,7 @@ class EasyImages:
 
         Parameters:
         -----------
+            - output_dir (str): Path of the main output directory
             - keyword (str): Keyword to create sub-directory
 
         Returns:
@@ -85,469 +311,1718 @@ class EasyImages:
 
         try:
 
-            if not os.path.exists(self.output_dir):
-                os.makedirs(self.output_dir)
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
                 time.sleep(0.2)
-                keyword_directory = os.path.join(self.output_dir, keyword)
+                keyword_directory = os.path.join(output_dir, keyword)
 
                 if not os.path.exists(keyword_directory):
                     os.makedirs(keyword_directory)
             else:
-                keyword_directory = os.path.join(self.output_dir, keyword)
+                keyword_directory = os.path.join(output_dir, keyword)
                 if not os.path.exists(keyword_directory):
                     os.makedirs(keyword_directory)
 
             self.logger.info("[INFO] Successfully created the directories.")
 
         except OSError as e:
-            self.logger.error("[ERROR] {}".format(e))
+            self.logger.error("[ERROR] %s", e)
             if e.errno != 17: raise
 
-    def _check(self, keywords_dict, check_type="Final"):
+    def _list_images(self, image_dir, recursive=False):
 
         '''
-        Prepare the summary dict for the given tag name.
+        List the image files present in a directory. Hidden files (partial downloads, hash index
+        etc.) are skipped.
 
         Parameters:
         -----------
-            - check_type (str): Final number of images
+            - image_dir (str): Path of the directory having images
+            - recursive (boolean): Whether to include the images of all the sub-directories, e.g. every keyword of an output directory
 
         Returns:
         --------
-        None
+        image_paths (list): Sorted list of image paths
         '''
 
-        for keyword_directory in keywords_dict.keys():
+        image_paths = []
 
-            keyword_directory_path = os.path.join(self.output_dir, keyword_directory.replace(" ", "_"))
-            self.summary_dict[keyword_directory][check_type] = len(os.listdir(keyword_directory_path))
+        for directory, sub_directories, file_names in os.walk(image_dir):
+            sub_directories[:] = sorted(name for name in sub_directories if not name.startswith('.'))
+            image_paths.extend(os.path.join(directory, file_name) for file_name in sorted(file_names) if not file_name.startswith('.'))
+            if not recursive: break
 
-    def _generate_hash(self, image, hash_size=8):
+        return image_paths
+
+    def _is_image_file(self, image_path):
 
         '''
-        Generate hash for the given image.
+        Whether a file is an image, by its extension or else by a known image header.
 
         Parameters:
         -----------
-            - image (numpy array): Keyword to create sub-directory
-            - hash_size (int): Size of hash
+            - image_path (str): Path of the file
 
         Returns:
         --------
-        Hash (int): Hash generated for the given image
+        Image (boolean): Whether the file is an image
         '''
 
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        resized = cv2.resize(gray, (hash_size + 1, hash_size))
-
-        diff = resized[:, 1:] > resized[:, :-1]
+        if os.path.splitext(image_path)[1].lower() in self.IMAGE_FILE_FORMATS:
+            return True
 
-        return sum([2 ** index for (index, value) in enumerate(diff.flatten()) if value])
+        try:
+            return read_image_header(image_path) is not None
+        except OSError:
+            return False
 
-    def _remove_duplicates(self, image_path):
+    def _check(self, keywords_dict, output_dir, summary_dict, check_type="Final"):
 
         '''
-        Find out if the given image is duplicate or not. True stand for duplicate.
+        Prepare the summary dict for the given tag name.
 
         Parameters:
         -----------
-            - image_path (str): Path of the image
+            - keywords_dict (dict): Keywords of the run
+            - output_dir (str): Path of the main output directory
+            - summary_dict (dict): Counts of every keyword, updated in place
+            - check_type (str): Final number of images
 
         Returns:
         --------
-        Duplicate (boolean): Duplicate or not
+        None
         '''
 
-        image = cv2.imread(image_path)
-        image_hash = self._generate_hash(image)
+        for keyword_directory in keywords_dict.keys():
 
-        same_hash_image_list = self.image_hash_dict.get(image_hash, [])
-        if len(same_hash_image_list) == 0:
-            same_hash_image_list.append(image_path)
-            self.image_hash_dict[image_hash] = same_hash_image_list
-            return False
-        else:
-            return True
+            keyword_directory_path = os.path.join(output_dir, keyword_directory.replace(" ", "_"))
+            summary_dict[keyword_directory][check_type] = len(self._list_images(keyword_directory_path))
 
-    def _scroll_down(self, number):
+    def _generate_hash(self, image, hash_size=8, hash_type='dhash'):
 
         '''
-        Scroll down the page according to the given number of images to download.
+        Generate hash for the given image.
 
         Parameters:
         -----------
-            - number (int): Number of the images to download
+            - image (numpy array): Decoded image
+            - hash_size (int): Size of hash
+            - hash_type (str): One of 'dhash', 'ahash' or 'phash'
 
         Returns:
         --------
-        None
+        Hash (int): Hash generated for the given image
         '''
 
-        # Number of times to scroll down
-        number = max(self.MIN_SCROLL_NUMBER, min(self.MAX_SCROLL_NUMBER,
-            int((number - self.IMAGES_PER_SCROLL)/self.SCROLL_SIMILARITY)))
-        for i in range(number):
-            time.sleep(self.PAGE_SCROLLING_TIMEOUT)
-            self.scroll_element.send_keys(Keys.DOWN)
+        return hashing.image_hash(image, hash_type=hash_type, hash_size=hash_size)
 
-    def _get_image_url(self, base_url, keyword, max_limit):
+    def _remove_duplicates(self, image_hash, image_path, image_hash_index, content_hash=None, content_hashes=None):
 
         '''
-        Get the list of image urls from the page.
+        Find out if the given image is duplicate or not. True stand for duplicate. An image is a
+        duplicate when an earlier image has exactly the same bytes (cheap sha256 check), or when
+        an earlier image of the keyword (or of the whole output directory, with a persistent hash
+        index) has a hash within max_distance bits. An image which is not a duplicate is added
+        to the index under the given path.
 
         Parameters:
         -----------
-            - base_url (str): Base url of the page where to visit to get the images
-            - max_limit (int): Maximum number of images needed
+            - image_hash (int): Perceptual hash of the image
+            - image_path (str): Path the image is (or will be) saved at
+            - image_hash_index (HashIndex): Hashes of the images kept so far
+            - content_hash (str): sha256 of the image bytes, None to skip the exact check
+            - content_hashes (set): sha256 of the images kept so far
 
         Returns:
         --------
-        image_url_list (list): List of image urls.
+        Duplicate (boolean): Duplicate or not
         '''
 
-        self.browser.get(base_url)
+        with self.hash_index_lock:
+            if content_hash is not None and content_hashes is not None and content_hash in content_hashes:
+                return True
 
-        # Wait to get the page loaded
-        time.sleep(self.PAGE_LOADING_TIMEOUT)
-        soup = bs4.BeautifulSoup(self.browser.page_source, features="html.parser")
-        self.scroll_element = self.browser.find_element(By.ID, 'yDmH0d')
+            if len(image_hash_index.search(image_hash)) == 0:
+                image_hash_index.add(image_hash, image_path)
+                if content_hash is not None and content_hashes is not None:
+                    content_hashes.add(content_hash)
+                return False
+            else:
+                return True
 
-        if self.scroll_element:
-            self._scroll_down(max_limit)
-            time.sleep(self.PAGE_LOADING_TIMEOUT)
-            soup = bs4.BeautifulSoup(self.browser.page_source, features="html.parser")
+    def _search_url(self, keyword):
 
-            if max_limit > self.IMAGES_PER_HALF_PAGE:
-                try:
-                    self.more_element = self.browser.find_element(By.CLASS_NAME, 'mye4qd')
-                    if self.more_element:
-                        self.more_element.click()
-                        time.sleep(self.PAGE_LOADING_TIMEOUT)
-                        if self.scroll_element: self._scroll_down(max_limit)
-                except Exception as e:
-                    self.logger.error("[ERROR] {}".format(e))
+        '''
+        Url of the Google Images result page of a keyword.
+
+        Parameters:
+        -----------
+            - keyword (str): Keyword for which images are searched
 
-        time.sleep(self.PAGE_LOADING_TIMEOUT)
-        image_url_list = set()
+        Returns:
+        --------
+        Url (str): Url of the result page
+        '''
 
-        image_elements = self.browser.find_elements(By.CLASS_NAME, 'rg_i.Q4LuWd')
+        return 'https://www.google.com/search?q=' + quote(
+        keyword.encode('utf-8')) + '&biw=1536&bih=674&tbm=isch&sxsrf=ACYBGNSXXpS6YmAKUiLKKBs6xWb4uUY5gA:1581168823770&source=lnms&sa=X&ved=0ahUKEwioj8jwiMLnAhW9AhAIHbXTBMMQ_AUI3QUoAQ'
 
-        for image_element in tqdm(image_elements, desc = "[INFO] Getting URLs for keyword '{}'".format(keyword), leave=False, colour="green"):
+    def _create_harvester(self, browser, url_extraction='auto'):
 
-            try:
-                image_element.click()
-                time.sleep(self.PAGE_SCROLLING_TIMEOUT)
-                soup = bs4.BeautifulSoup(self.browser.page_source, features="html.parser")
+        '''
+        Url harvester of a result page, with the waits of this object.
 
-                for image_element in soup.find_all('img', class_='n3VNCb'):
-                    if image_element.has_attr('src'):
-                        if "data:image" not in image_element['src']:
-                            image_url_list.add(image_element['src'])
+        Parameters:
+        -----------
+            - browser (WebDriver): Browser used to visit the page
+            - url_extraction (str): 'page_data', 'click' or 'auto', as for download()
 
-            except Exception as e:
-                self.logger.error("[ERROR] {}".format(e))
+        Returns:
+        --------
+        Harvester (GoogleImagesHarvester): Harvester driving the browser
+        '''
+
+        from easy_images.harvester import GoogleImagesHarvester
 
-        return list(image_url_list)
+        return GoogleImagesHarvester(browser, page_loading_timeout=self.PAGE_LOADING_TIMEOUT,
+            preview_timeout=self.PREVIEW_TIMEOUT, poll_interval=self.PAGE_POLL_INTERVAL,
+            max_scroll_number=self.MAX_SCROLL_NUMBER, url_surplus_factor=self.URL_SURPLUS_FACTOR,
+            extraction=url_extraction, logger=self.logger)
 
-    def download(self, keywords, output_dir='easy_images_dir', max_limit=10, image_formats={'.jpg', '.jpeg', '.png'}, remove_duplicates=False):
+    def _stream_image_urls(self, browser_pool, base_url, keyword, max_limit, harvest_stats, cached_urls=None, stats=None,
+                           url_extraction='auto'):
 
         '''
-        Download the images for the given keyword(s) as per given a number of helpful variables like
-        (maximum number of images, image formas, remove duplicate or not etc.).
+        Yield the cached image urls first, then harvest more in a background thread and yield them
+        through a bounded queue as soon as they are found, so downloads start while the browser is
+        still harvesting. A browser is only taken from the pool once the cached urls are used up.
+        Closing the generator (e.g. once max_limit images are accepted) stops the harvester, and no
+        further thumbnail is clicked. The harvester runs at most min(URL_QUEUE_SIZE, max_limit) urls
+        ahead of the consumer, so no more thumbnails are clicked than the images still needed. A
+        browser error ends the urls, and the browser is quit and replaced in the pool instead of
+        being reused.
 
         Parameters:
         -----------
-            - keywords (str / dict): Keywords for which images will be downloaded
-            - output_dir (srt): Path of the main output directory
+            - browser_pool (BrowserPool): Pool of the browser used to visit the page
+            - base_url (str): Base url of the page where to visit to get the images
+            - keyword (str): Keyword for which images are searched
             - max_limit (int): Maximum number of images needed
-            - image_formats (set): Supported image formats
-            - remove_duplicates (boolean): Whether to remove duplicate images or not while downloading. Set remove_duplicates=True to remove duplicates.
+            - harvest_stats (dict): Updated with the number of urls yielded so far ('Found'), taken from the cache ('Cached'),
+              the urls harvested by the browser ('urls') and whether the browser was used ('browser_used')
+            - cached_urls (list): Urls of the keyword from the url cache
+            - stats (RunStats): Run stats, gets the seconds spent harvesting (waiting for the browser and for a full queue excluded)
+            - url_extraction (str): 'page_data', 'click' or 'auto', as for download()
 
         Returns:
         --------
-        None
+        image_urls (generator): Image urls, in the order of the thumbnails
         '''
 
-        start_time = datetime.now()
-
-        self.output_dir = output_dir
-        self.image_formats = image_formats
-        self.summary_dict = {}
+        cached_urls = cached_urls or []
 
-        # Make the keyword dict e.g {"dog": 10, "cat": 10} from "dog, cat"
-        if isinstance(keywords, str):
-            keywords_dict = {str(item).strip():max_limit for item in keywords.split(',')}
-        else:
-            keywords_dict = keywords
+        for image_url in cached_urls:
+            harvest_stats['Found'] += 1
+            harvest_stats['Cached'] += 1
+            yield image_url
 
-        option = Options()
-        if self.headless: option.add_argument("--headless")
+        # More urls are needed than are cached, go back to the browser
+        known_urls = set(cached_urls)
+        harvest_stats['browser_used'] = True
 
-        if self.browser_name == self.BROWSER_NAME:
-            option.binary_location = self.BROWSER_FILE_PATH
-            self.browser = webdriver.Chrome(options = option, service = Service(ChromeDriverManager().install()))
-        else:
-            self.browser = webdriver.Chrome(options = option, service = Service(ChromeDriverManager().install()))
+        harvest_errors = []
 
-        ##########################################################################################
-        # Downloading section
+        try:
+            with browser_pool.acquire() as browser:
+
+                harvester = self._create_harvester(browser, url_extraction)
+
+                # A url is taken before the harvester looks for the next one, and given back once it is consumed
+                url_slots = threading.Semaphore(max(1, min(self.URL_QUEUE_SIZE, max_limit)))
+                url_queue = queue.Queue()
+                stop_event = threading.Event()
+                end_of_urls = object()
+
+                def take_slot():
+                    # Time out regularly, so a harvester waiting for the consumer never blocks once stopped
+                    while not stop_event.is_set():
+                        if url_slots.acquire(timeout=self.PAGE_POLL_INTERVAL): return True
+                    return False
+
+                def put(item):
+                    # Time out regularly, so a full queue never blocks a stopped harvester
+                    while not stop_event.is_set():
+                        try:
+                            url_queue.put(item, timeout=self.PAGE_POLL_INTERVAL)
+                            return True
+                        except queue.Full:
+                            pass
+                    return False
+
+                def harvest():
+                    harvest_seconds = 0.0
+                    start_time = time.perf_counter()
+                    image_urls = harvester.iter_image_urls(base_url, keyword, max_limit, stop_event)
+                    try:
+                        while take_slot():
+                            start_time = time.perf_counter()
+                            image_url = next(image_urls, end_of_urls)
+                            harvest_seconds += time.perf_counter() - start_time
+                            if image_url is end_of_urls: break
+                            if image_url in known_urls:
+                                url_slots.release()
+                                continue
+                            harvest_stats['urls'].append(image_url)
+                            if not put(image_url): break
+                    except Exception as e:
+                        harvest_seconds += time.perf_counter() - start_time
+                        self.logger.error("[ERROR] %s", e)
+                        if stats is not None: stats.add_failure('harvest_error', keyword, e)
+                        harvest_errors.append(e)
+                    finally:
+                        image_urls.close()
+                        if stats is not None: stats.add_times({'harvest': harvest_seconds}, keyword)
+                        put(end_of_urls)
+
+                harvest_thread = threading.Thread(target=harvest, name="harvester-{}".format(keyword), daemon=True)
+                harvest_thread.start()
 
-        print(self.PRINT_FORMAT["1_NEWLINE"])
-        for keyword, max_limit in tqdm(keywords_dict.items(), desc = '[INFO] Downloading images', colour="CYAN"):
+                try:
+                    while True:
+                        image_url = url_queue.get()
+                        if image_url is end_of_urls: break
+                        url_slots.release()
+                        harvest_stats['Found'] += 1
+                        yield image_url
+                finally:
+                    stop_event.set()
+                    harvest_thread.join()
 
-            count_dict = {'Found': 0, 'Downloaded': 0}
-            image_url_list = []
-            image_number = 0
+                    # Raised inside the block, so the pool quits the failed browser instead of reusing it
+                    if harvest_errors: raise harvest_errors[0]
 
-            if remove_duplicates:
-                self.logger.info("[INFO] Remove duplicates factor is set.")
-                self.image_hash_dict = {}
+        except Exception as e:
+            # The error is logged and counted by the harvester, the urls found so far are still downloaded
+            if not harvest_errors or e is not harvest_errors[0]: raise
 
-            base_url = 'https://www.google.com/search?q=' + quote(
-            keyword.encode('utf-8')) + '&biw=1536&bih=674&tbm=isch&sxsrf=ACYBGNSXXpS6YmAKUiLKKBs6xWb4uUY5gA:1581168823770&source=lnms&sa=X&ved=0ahUKEwioj8jwiMLnAhW9AhAIHbXTBMMQ_AUI3QUoAQ'
+    def connection_stats(self):
 
-            image_url_list = self._get_image_url(base_url, keyword, max_limit)
+        '''
+        Connection reuse stats of the image download session, to confirm that keep-alive pooling works.
 
-            self._make_directory(keyword)
-            keyword_directory_path = os.path.join(self.output_dir, keyword.replace(" ", "_"))
+        Returns:
+        --------
+        Stats (dict): Number of requests, new connections and reused connections
+        '''
 
-            for image_index in tqdm(range(len(image_url_list)), desc = "[INFO] Downloading images for keyword '{}'".format(keyword), leave=False, colour="green"):
+        if self.http_session is None:
+            return {'requests': 0, 'new_connections': 0, 'reused_connections': 0}
 
-                if count_dict['Downloaded'] == max_limit:
-                    break
+        return self.http_session.connection_stats()
 
-                try:
-                    request_object = requests.get(image_url_list[image_index], allow_redirects=True, timeout=1)
+    def _fetch_image(self, image_url, options, hash_image=False, stats=None, keyword=None, keep_image=False, content_hashes=None):
 
-                    if('html' not in str(request_object.content)):
-                        mime = magic.Magic(mime=True)
-                        file_type = mime.from_buffer(request_object.content)
-                        file_format = f'.{file_type.split("/")[-1]}'
+        '''
+        Download a single image into memory and validate it there. The format is sniffed from the
+        first few KB, so html pages and disallowed formats are dropped before the body is read, and
+        downloads bigger than options.max_bytes are aborted. The content digest is computed first, so
+        byte-identical copies of kept images are not decoded at all. Other images are decoded with
+        OpenCV, so corrupt images are rejected before anything is written to disk. Runs inside the
+        download worker threads, which also compute the perceptual hash.
 
-                        if file_format not in image_formats:
-                            raise ValueError()
+        Parameters:
+        -----------
+            - image_url (str): Url of the image
+            - options (DownloadOptions): Options of the call, for the image formats, max_bytes and the hash
+            - hash_image (boolean): Whether to compute the perceptual hash, for removing duplicates
+            - stats (RunStats): Run stats, gets the seconds spent fetching, sniffing, decoding and hashing
+            - keyword (str): Keyword of the image, for the stats
+            - keep_image (boolean): Whether to return the decoded image, otherwise it is dropped after validation
+            - content_hashes (set): sha256 of the images kept so far. It only grows, so it is read without the hash index lock.
 
-                        file_name = str(keyword.replace(" ", "_")) + "_" + str(image_number + 1) + file_format
+        Returns:
+        --------
+        (data, file_format, content_hash, image_hash, image) (tuple): Bytes of the image, file format e.g. '.jpeg', sha256 of
+        the bytes, perceptual hash (None if hash_image is False or for a byte-identical copy of a kept image) and decoded image
+        (None if keep_image is False or for a copy)
+        '''
 
-                        file_path = os.path.join(keyword_directory_path, file_name)
+        timings = {}
+        start_time = time.perf_counter()
 
-                        with open(file_path, 'wb') as file:
-                            file.write(request_object.content)
+        try:
+            request_object = self.http_session.get(image_url, stream=True)
 
-                        if remove_duplicates:
+            try:
+                request_object.raise_for_status()
 
-                            if self._remove_duplicates(file_path):
-                                try:
-                                    count_dict['Downloaded'] -= 1
-                                    image_number -= 1
-                                    os.remove(file_path)
-                                except Exception as e:
-                                    self.logger.error("[ERROR] {}".format(e))
+                content_type = request_object.headers.get('Content-Type', '')
+                if content_type.startswith('text/'):
+                    raise FetchError("Got '{}' instead of an image from {}".format(content_type, image_url), 'not_image')
 
-                        image_number += 1
-                        count_dict['Downloaded'] += 1
+                content_length = request_object.headers.get('Content-Length', '')
+                if content_length.isdigit() and int(content_length) > options.max_bytes:
+                    raise FetchError("Image of {} bytes exceeds the limit of {} bytes: {}".format(content_length, options.max_bytes, image_url),
+                                     'too_large')
 
-                except Exception as e:
-                    self.logger.error("[ERROR] {}".format(e))
+                chunks = request_object.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE)
 
-            if count_dict['Downloaded'] < max_limit:
-                self.logger.info("[INFO] Only {} images are downloaded for keyword '{}'".format(
-                count_dict['Downloaded'], keyword))
-            else:
-                self.logger.info("[INFO] Total {} images are downloaded for keyword '{}'".format(
-                count_dict['Downloaded'], keyword))
+                data = bytearray()
+                for chunk in chunks:
+                    data += chunk
+                    if len(data) >= self.MIME_SNIFF_SIZE: break
 
-            count_dict['Found'] = len(image_url_list)
-            self.summary_dict[keyword] = count_dict
+                sniff_time = time.perf_counter()
+                file_type = self.mime.from_buffer(bytes(data[:self.MIME_SNIFF_SIZE]))
+                file_format = f'.{file_type.split("/")[-1]}'
+                timings['sniff'] = time.perf_counter() - sniff_time
 
-        self.browser.close()
+                if not file_type.startswith('image/'):
+                    raise FetchError("Got '{}' instead of an image from {}".format(file_type, image_url), 'not_image')
+                if file_format not in options.image_formats:
+                    raise FetchError("Unsupported format '{}' from {}".format(file_type, image_url), 'unsupported_format')
 
-        ##########################################################################################
-        # Print Section
+                for chunk in chunks:
+                    data += chunk
+                    if len(data) > options.max_bytes:
+                        raise FetchError("Image exceeds the limit of {} bytes: {}".format(options.max_bytes, image_url), 'too_large')
 
-        self._check(keywords_dict, check_type="Final")
-        end_time = datetime.now()
+            finally:
+                request_object.close()
+                timings['fetch'] = time.perf_counter() - start_time - timings.get('sniff', 0.0)
 
-        print(self.PRINT_FORMAT["1_NEWLINE"])
-        print(self.PRINT_FORMAT["LINE"]["SYMBOL"]*self.PRINT_FORMAT["LINE"]["LENGTH"],
-            end=self.PRINT_FORMAT["2_NEWLINE"])
+            hash_time = time.perf_counter()
+            content_hash = hashlib.sha256(data).hexdigest()
+            timings['hash'] = time.perf_counter() - hash_time
 
-        print('[INFO] Total time taken (hh:mm:ss.ms) {}'.format(end_time - start_time),
-            end=self.PRINT_FORMAT["2_NEWLINE"])
+            image = image_hash = None
 
-        print(self.PRINT_FORMAT["LINE"]["SYMBOL"]*self.PRINT_FORMAT["LINE"]["LENGTH"],
-            end=self.PRINT_FORMAT["2_NEWLINE"])
+            # A byte-identical copy of a kept image is a duplicate, it needs neither decoding nor a perceptual hash
+            if content_hashes is None or content_hash not in content_hashes:
+                decode_time = time.perf_counter()
+                image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                timings['decode'] = time.perf_counter() - decode_time
+                if image is None:
+                    raise FetchError("Can not decode the image from {}".format(image_url), 'undecodable')
 
-        print("[SUMMARY] Summary of downloaded images:", end=self.PRINT_FORMAT["2_NEWLINE"])
+                if hash_image:
+                    hash_time = time.perf_counter()
+                    image_hash = self._generate_hash(image, hash_size=options.hash_size, hash_type=options.hash_type)
+                    timings['hash'] += time.perf_counter() - hash_time
 
-        summary_list = [[key]+list(value.values()) for key, value in self.summary_dict.items()]
-        headers = ['Keyword']+list(list(self.summary_dict.values())[0].keys())
-        print(tabulate(summary_list, headers=headers), end=self.PRINT_FORMAT["2_NEWLINE"])
+        finally:
+            if stats is not None:
+                if 'fetch' not in timings: timings['fetch'] = time.perf_counter() - start_time
+                stats.add_times(timings, keyword)
 
-        print(self.PRINT_FORMAT["LINE"]["SYMBOL"]*self.PRINT_FORMAT["LINE"]["LENGTH"],
-            end=self.PRINT_FORMAT["2_NEWLINE"])
+        if stats is not None: stats.add_bytes('fetched', len(data), keyword)
 
-    ##########################################################################################
-    ##########################################################################################
-    # Extra Functionalities
+        return bytes(data), file_format, content_hash, image_hash, image if keep_image else None
 
-    def remove_duplicates(self, image_dir):
+    def _write_image(self, data, file_path):
 
         '''
-        Remove the duplicate images present in a directory.
+        Write an accepted image through a hidden temporary file, so an interrupted write never
+        leaves a truncated image behind.
 
         Parameters:
         -----------
-            - image_dir (str): Path of the directory having images
+            - data (bytes): Bytes of the image
+            - file_path (str): Path of the image
 
         Returns:
         --------
         None
         '''
 
-        image_hash_dict = {}
-        image_dir_name = image_dir.split("/")[-1]
-        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
-        number_of_images = len(os.listdir(image_dir))
-
-        for image_name in tqdm(os.listdir(image_dir), desc = '[INFO] Removing duplicate images for "{}"'.format(image_dir_name), colour="red"):
-
-            if number_of_images <= 1000: time.sleep(self.UTILITY_FUNCTIONS_TIMEOUT)
-            image_path = os.path.join(image_dir, image_name)
-            image = cv2.imread(image_path)
-
-            if image is None:
-                try:
-                    os.remove(image_path)
-                except Exception as e:
-                    self.logger.error("[ERROR] {}".format(e))
-            else:
-                image_hash = self._generate_hash(image)
-                same_hash_image_list = image_hash_dict.get(image_hash, [])
-                same_hash_image_list.append(image_path)
-                image_hash_dict[image_hash] = same_hash_image_list
-
-        for (image_hash, hashed_paths) in image_hash_dict.items():
+        part_path = os.path.join(os.path.dirname(file_path), '.{}{}'.format(uuid.uuid4().hex, self.PART_FILE_SUFFIX))
 
-            if len(hashed_paths) > 1:
-                for image_path in hashed_paths[1:]:
-                    try:
-                        os.remove(image_path)
-                    except Exception as e:
-                        self.logger.error("[ERROR] {}".format(e))
+        try:
+            with open(part_path, 'wb') as file:
+                file.write(data)
+            os.replace(part_path, file_path)
+        except Exception:
+            if os.path.exists(part_path): os.remove(part_path)
+            raise
 
-    def resize_and_save(self, image_dir, size=(200, 200)):
+    def _download_images(self, image_urls, keyword, keyword_directory_path, max_limit, options, remove_duplicates=False, max_workers=8,
+                         image_hash_index=None, new_hash_entries=None, manifest=None, start_number=0, content_hashes=None, stats=None):
 
         '''
-        Resize images present in a directory.
+        Download the images for the given keyword with a pool of worker threads. Urls are fetched
+        concurrently but accepted strictly in the order of the urls, so file numbering stays
+        deterministic and exactly max_limit images are kept (if available). Urls are pulled lazily,
+        so they can come from a generator which is still harvesting.
+
+        Images are validated and checked for duplicates in memory, only accepted images are
+        written. At most max_workers * DOWNLOAD_WINDOW_FACTOR images (each up to options.max_bytes) are
+        held in memory at a time.
 
         Parameters:
         -----------
-            - image_dir (str): Path of the directory having images
-            - size (tuple): Image size to resize
+            - image_urls (iterable): Image urls, e.g. a list or the generator of _stream_image_urls
+            - keyword (str): Keyword for which images are downloaded
+            - keyword_directory_path (str): Path of the keyword directory
+            - max_limit (int): Maximum number of images needed
+            - options (DownloadOptions): Options of the call
+            - remove_duplicates (boolean): Whether to remove duplicate images or not while downloading
+            - max_workers (int): Number of concurrent downloads
+            - image_hash_index (HashIndex): Hashes of the images kept so far, used with remove_duplicates
+            - new_hash_entries (list): Collects the entries to store in the persistent hash index, None without one
+            - manifest (Manifest): Manifest of the keyword directory, gets a record for every url
+            - start_number (int): Number of the last image already in the directory, numbering continues after it
+            - content_hashes (set): sha256 of the images kept so far, used with remove_duplicates
+            - stats (RunStats): Run stats, gets the stage timings, byte counts, duplicates and failures of the keyword
 
         Returns:
         --------
-        None
+        image_number (int): Number of images downloaded
         '''
 
-        image_dir_name = image_dir.split("/")[-1]
-        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
-        number_of_images = len(os.listdir(image_dir))
+        image_number = 0
+
+        if remove_duplicates and content_hashes is None:
+            content_hashes = set()
+
+        fetch = partial(self._fetch_image, options=options, hash_image=remove_duplicates, stats=stats, keyword=keyword, content_hashes=content_hashes)
+        progress_bar = tqdm(total=max_limit, desc = "[INFO] Downloading images for keyword '{}'".format(keyword), leave=False, colour="green")
+
+        try:
+            with closing(self._fetch_in_order(image_urls, fetch, max_workers, lambda: max_limit - image_number)) as fetched_images:
+
+                for image_url, result, error in fetched_images:
 
-        for image_name in tqdm(os.listdir(image_dir), desc = '[INFO] Resizing images with {} for "{}"'.format(size, image_dir_name), colour="#2554C7"):
-            if number_of_images <= 1000: time.sleep(self.UTILITY_FUNCTIONS_TIMEOUT)
-            image_path = os.path.join(image_dir, image_name)
-            image = cv2.imread(image_path)
+                    try:
+                        if error is not None: raise error
+                        data, file_format, content_hash, image_hash, _ = result
+
+                        file_name = str(keyword.replace(" ", "_")) + "_" + str(start_number + image_number + 1) + file_format
+                        file_path = os.path.join(keyword_directory_path, file_name)
+
+                        if remove_duplicates and self._remove_duplicates(image_hash, file_path, image_hash_index, content_hash, content_hashes):
+                            if stats is not None: stats.count('Duplicates', keyword=keyword)
+                            if manifest is not None:
+                                manifest.add(image_url, Manifest.STATUS_DUPLICATE, None, content_hash, len(data))
+                        else:
+                            if stats is not None:
+                                with stats.timer('write', keyword):
+                                    self._write_image(data, file_path)
+                                stats.add_bytes('written', len(data), keyword)
+                            else:
+                                self._write_image(data, file_path)
+                            image_number += 1
+                            progress_bar.update(1)
+
+                            if remove_duplicates and new_hash_entries is not None:
+                                new_hash_entries.append((HashStore.file_key(file_path), image_hash))
+                            if manifest is not None:
+                                manifest.add(image_url, Manifest.STATUS_DOWNLOADED, file_name, content_hash, len(data))
 
-            if image is not None:
-                image = cv2.resize(image, size)
-                cv2.imwrite(image_path, image)
+                    except Exception as e:
+                        self.logger.error("[ERROR] %s", e)
+                        reason = failure_reason(e)
+                        if stats is not None:
+                            stats.count('Failed', keyword=keyword)
+                            stats.add_failure(reason, keyword, e)
+                        if manifest is not None:
+                            manifest.add(image_url, Manifest.STATUS_FAILED, reason=reason)
+
+        finally:
+            progress_bar.close()
 
-    def to_grayscale(self, image_dir):
+        return image_number
+
+    def _fetch_in_order(self, image_urls, fetch, max_workers, remaining):
 
         '''
-        Convert images present in a directory to grayscale.
+        Fetch urls with a pool of worker threads and yield the results strictly in the order of
+        the urls. At most max_workers * DOWNLOAD_WINDOW_FACTOR fetches are in flight or waiting to
+        be consumed, and never more than can still be accepted, so memory stays bounded and a slow
+        consumer holds back the fetches. Urls are pulled lazily, so they can come from a generator
+        which is still harvesting. Closing the generator cancels the surplus fetches.
 
         Parameters:
         -----------
-            - image_dir (str): Path of the directory having images
+            - image_urls (iterable): Image urls
+            - fetch (callable): Function fetching a url, run in the worker threads
+            - max_workers (int): Number of concurrent fetches
+            - remaining (callable): Function without arguments returning the number of images which can still be accepted
 
         Returns:
         --------
-        None
+        Results (generator): (image_url, result, error) for every url, error is the exception raised by fetch (or None)
         '''
 
-        image_dir_name = image_dir.split("/")[-1]
-        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
-        number_of_images = len(os.listdir(image_dir))
+        max_workers = max(1, int(max_workers))
+        window_size = max_workers * self.DOWNLOAD_WINDOW_FACTOR
+        url_iterator = iter(image_urls)
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
 
-        for image_name in tqdm(os.listdir(image_dir), desc = '[INFO] Grayscaling images for "{}"'.format(image_dir_name), colour="#778899"):
-            if number_of_images <= 1000: time.sleep(self.UTILITY_FUNCTIONS_TIMEOUT)
-            image_path = os.path.join(image_dir, image_name)
-            image = cv2.imread(image_path)
+        def fill_window():
+            # Keep the window full, but never fetch more than can still be accepted
+            while len(pending) < min(window_size, remaining()):
+                image_url = next(url_iterator, None)
+                if image_url is None: break
+                pending.append((image_url, executor.submit(fetch, image_url)))
+
+        try:
+            fill_window()
+
+            while pending and remaining() > 0:
+                image_url, future = pending.popleft()
 
-            if image is not None:
                 try:
-                    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                    cv2.imwrite(image_path, image)
+                    result, error = future.result(), None
                 except Exception as e:
-                    self.logger.error("[ERROR] {}".format(e))
+                    result, error = None, e
+
+                yield image_url, result, error
+                fill_window()
 
-    def calculate_avg_image_size(self, image_dir):
+        finally:
+            # Surplus images fetched after the last accepted one are only in memory
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _download_keyword(self, browser_pool, keyword, max_limit, options, remove_duplicates=False, max_workers=8, shared_hash_index=None,
+                          url_cache=None, resume=False, stats=None):
 
         '''
-        Calculate average image size of the images present in a directory.
+        Harvest and download the images of one keyword. Urls are taken from the url cache first,
+        and a browser is borrowed from the pool only when more urls are needed. Every url gets a
+        record in the manifest of the keyword directory.
 
         Parameters:
         -----------
-            - image_dir (str): Path of the directory having images
+            - browser_pool (BrowserPool): Pool of browsers
+            - keyword (str): Keyword for which images are downloaded
+            - max_limit (int): Maximum number of images needed
+            - options (DownloadOptions): Options of the download() call
+            - remove_duplicates (boolean): Whether to remove duplicate images or not while downloading
+            - max_workers (int): Number of concurrent downloads
+            - shared_hash_index (HashIndex): Hash index of the whole output directory, None to find duplicates within the keyword only
+            - url_cache (UrlCache): Cache of the harvested urls, None to always harvest
+            - resume (boolean): Whether to continue from the manifest: known urls are skipped, numbering continues
+              and only the images missing to reach max_limit are downloaded
+            - stats (RunStats): Run stats, gets the counts, timings and failures of the keyword
 
         Returns:
         --------
-        None
+        (count_dict, new_hash_entries, cache_hit) (tuple): Counts of the keyword, the entries to store in the persistent hash index,
+        and whether the keyword was served from the url cache alone (None without a cache)
         '''
 
-        heights = []
-        widths = []
+        count_dict = {'Found': 0, 'Downloaded': 0}
+        harvest_stats = {'Found': 0, 'Cached': 0, 'urls': [], 'browser_used': False}
+        image_hash_index = None
+        new_hash_entries = None
+        content_hashes = None
 
-        image_dir_name = image_dir.split("/")[-1]
-        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+        if remove_duplicates:
+            self.logger.info("[INFO] Remove duplicates factor is set.")
+            if shared_hash_index is None:
+                image_hash_index = HashIndex(options.max_distance, options.hash_size * options.hash_size)
+            else:
+                image_hash_index = shared_hash_index
+                new_hash_entries = []
 
-        for image_name in tqdm(os.listdir(image_dir), desc = '[INFO] Calculating average image size for "{}"'.format(image_dir_name), colour="#E2F516"):
-            try:
-                image_path = os.path.join(image_dir, image_name)
-                image = cv2.imread(image_path)
-                height, width, _ = image.shape
-                heights.append(height)
-                widths.append(width)
-            except Exception as e:
-                self.logger.error("[ERROR] {}".format(e))
+        base_url = self._search_url(keyword)
+
+        keyword_directory_path = os.path.join(options.output_dir, keyword.replace(" ", "_"))
+
+        existing_images = self._list_images(keyword_directory_path)
+
+        # The records of the images kept on disk are kept, only a directory without images starts a new manifest
+        manifest = Manifest(keyword_directory_path, resume=resume, reset=not resume and not existing_images)
+        known_urls = manifest.known_urls()
+
+        # Directories of earlier releases (or with a lost manifest) have images but no records, so the files count too
+        number_of_existing = len(existing_images) if resume else 0
+
+        # Resumed images and the images of the shared index stay on disk, new images are numbered after all of them
+        start_number = manifest.last_number()
+        if resume or shared_hash_index is not None:
+            start_number = max(start_number, manifest.last_file_number())
+
+        # Byte-identical copies of the recorded images are caught by their sha256, before any decoding
+        if remove_duplicates:
+            # The latest record of a file wins, an overwritten image is no longer on disk
+            file_hashes = {record['file']: record['sha256'] for record in manifest.records
+                           if record['status'] == Manifest.STATUS_DOWNLOADED}
+            content_hashes = {content_hash for content_hash in file_hashes.values() if content_hash}
+
+        # Images of the interrupted run are not in a fresh index of the keyword
+        if resume and remove_duplicates and shared_hash_index is None and number_of_existing:
+            hashed_paths, _ = self._hash_directory(keyword_directory_path, options.hash_type, options.hash_size,
+                                                   desc="Indexing existing images of '{}'".format(keyword))
+            for image_path, image_hash in hashed_paths:
+                image_hash_index.add(image_hash, image_path)
+
+        cached_urls = url_cache.get(keyword) if url_cache is not None else None
+
+        # Harvesting and downloading overlap: urls are downloaded as soon as they are found
+        image_url_stream = self._stream_image_urls(browser_pool, base_url, keyword, max_limit, harvest_stats, cached_urls, stats,
+                                                   options.url_extraction)
+        try:
+            count_dict['Downloaded'] = self._download_images((image_url for image_url in image_url_stream if image_url not in known_urls),
+                keyword, keyword_directory_path, max(0, max_limit - number_of_existing), options, remove_duplicates, max_workers,
+                image_hash_index, new_hash_entries, manifest, start_number, content_hashes, stats)
+        finally:
+            image_url_stream.close()
+            manifest.close()
+
+        if number_of_existing + count_dict['Downloaded'] < max_limit:
+            self.logger.info("[INFO] Only %s images are downloaded for keyword '%s'", count_dict['Downloaded'], keyword)
+        else:
+            self.logger.info("[INFO] Total %s images are downloaded for keyword '%s'", count_dict['Downloaded'], keyword)
+
+        count_dict['Found'] = harvest_stats['Found']
+
+        if stats is not None:
+            stats.count('Found', harvest_stats['Found'], keyword)
+            stats.count('Cached', harvest_stats['Cached'], keyword)
+            stats.count('Downloaded', count_dict['Downloaded'], keyword)
+
+        cache_hit = None
+        if url_cache is not None:
+            cache_hit = not harvest_stats['browser_used']
+            if harvest_stats['urls']:
+                url_cache.put(keyword, (cached_urls or []) + harvest_stats['urls'])
+
+        return count_dict, new_hash_entries, cache_hit
+
+    def download(self, keywords, output_dir='easy_images_dir', max_limit=10, image_formats={'.jpg', '.jpeg', '.png'}, remove_duplicates=False, max_workers=8, max_bytes=10 * 1024 * 1024,
+                 hash_type='dhash', hash_size=8, max_distance=0, hash_index_path=None, url_extraction='auto', browsers=1,
+                 url_cache_path=None, url_cache_ttl=24 * 3600, resume=False, shard_dir=None, verbose=True):
+
+        '''
+        Download the images for the given keyword(s) as per given a number of helpful variables like
+        (maximum number of images, image formas, remove duplicate or not etc.).
+
+        Parameters:
+        -----------
+            - keywords (str / dict): Keywords for which images will be downloaded
+            - output_dir (srt): Path of the main output directory
+            - max_limit (int): Maximum number of images needed
+            - image_formats (set): Supported image formats
+            - remove_duplicates (boolean): Whether to remove duplicate images or not while downloading. Set remove_duplicates=True to remove duplicates.
+            - max_workers (int): Number of images downloaded concurrently for a keyword. Set max_workers=1 to download one by one.
+            - max_bytes (int): Maximum size of an image in bytes. Bigger images are skipped without being fully downloaded.
+            - hash_type (str): Perceptual hash used to find duplicates, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates. 0 means identical hashes.
+            - hash_index_path (str): Path of a persistent hash index (SQLite file). With remove_duplicates=True, duplicates are removed across all the keywords of output_dir, and existing images are only hashed once across runs.
+            - url_extraction (str): 'page_data' reads the image urls from the data embedded in the result page in one pass, 'click' clicks every thumbnail, 'auto' reads the page data and clicks thumbnails only when more urls are needed.
+            - browsers (int): Number of browsers, i.e. of keywords processed concurrently. A failing keyword does not stop the others. Within a session opened by open(), the browsers of the session are used instead.
+            - url_cache_path (str): Path of a persistent url cache (SQLite file). Keywords are served from the urls harvested by earlier runs, and the browser is only used when more urls are needed.
+            - url_cache_ttl (float): Seconds after which the cached urls of a keyword expire
+            - resume (boolean): Continue an interrupted or earlier run from the manifest of every keyword directory. Urls already fetched or known to be bad are skipped, numbering continues after the existing images, and only the images missing to reach max_limit are downloaded.
+            - shard_dir (str): Also pack all the images of output_dir into tar shards with an index at shard_dir, labelled by keyword (see pack_shards)
+            - verbose (boolean): Whether to print the summary. Set verbose=False to only get the returned stats.
+
+        Returns:
+        --------
+        Stats (RunStats): Counts (found, cached, downloaded, duplicates, failed, final), bytes fetched and written, failures by
+        reason and seconds per stage (harvest, fetch, sniff, decode, hash, write), in total and per keyword under stats.keywords
+        '''
+
+        start_time = datetime.now()
+        stats = RunStats('download', self.hooks, self.logger)
+        self._open_download_resources()
+
+        options = DownloadOptions(output_dir, frozenset(image_formats), max_bytes, hash_type, hash_size, max_distance, url_extraction)
+
+        # Make the keyword dict e.g {"dog": 10, "cat": 10} from "dog, cat"
+        if isinstance(keywords, str):
+            keywords_dict = {str(item).strip():max_limit for item in keywords.split(',')}
+        else:
+            keywords_dict = keywords
+
+        hash_store = None
+        shared_hash_index = None
+
+        if remove_duplicates and hash_index_path:
+            hash_store = HashStore(hash_index_path)
+            shared_hash_index = HashIndex(max_distance, hash_size * hash_size)
+
+            if os.path.exists(output_dir):
+                with stats.timer('index'):
+                    hashed_paths, _ = self._hash_directory(output_dir, hash_type, hash_size, desc='Indexing existing images',
+                                                           recursive=True, hash_store=hash_store)
+                    for image_path, image_hash in hashed_paths:
+                        shared_hash_index.add(image_hash, image_path)
+
+        url_cache = None
+        url_cache_stats = {'hits': 0, 'misses': 0}
+        if url_cache_path:
+            url_cache = UrlCache(url_cache_path, ttl=url_cache_ttl, max_entries=self.URL_CACHE_MAX_ENTRIES)
+
+        ##########################################################################################
+        # Downloading section
+
+        for keyword in keywords_dict.keys():
+            self._make_directory(output_dir, keyword)
+            for name in ('Found', 'Cached', 'Downloaded', 'Duplicates', 'Failed'):
+                stats.count(name, 0, keyword)
+
+        # Reuse the browsers of an open session, otherwise start browsers for this call only
+        session_pool = self.browser_pool is not None
+        browser_pool = self.browser_pool if session_pool else BrowserPool(self.driver_factory, browsers, health_check=self._browser_alive, logger=self.logger)
+        keyword_executor = ThreadPoolExecutor(max_workers=browser_pool.size)
+        results = {}
+
+        def download_keyword(keyword, max_limit):
+            return self._download_keyword(browser_pool, keyword, max_limit, options, remove_duplicates, max_workers, shared_hash_index,
+                                          url_cache, resume, stats)
+
+        if verbose: print(self.PRINT_FORMAT["1_NEWLINE"])
+        progress_bar = tqdm(total=len(keywords_dict), desc = '[INFO] Downloading images', colour="CYAN")
+
+        try:
+            futures = {keyword_executor.submit(download_keyword, keyword, max_limit): keyword
+                       for keyword, max_limit in keywords_dict.items()}
+
+            for future in as_completed(futures):
+                keyword = futures[future]
+                progress_bar.update(1)
+
+                try:
+                    count_dict, new_hash_entries, cache_hit = future.result()
+                except Exception as e:
+                    self.logger.error("[ERROR] Keyword '%s' failed: %s", keyword, e)
+                    stats.add_failure('keyword_error', keyword, e)
+                    count_dict, new_hash_entries, cache_hit = {'Found': 0, 'Downloaded': 0}, None, None
+
+                if cache_hit is not None:
+                    url_cache_stats['hits' if cache_hit else 'misses'] += 1
+
+                # SQLite connections belong to the thread which opened them, store from here
+                if hash_store is not None and new_hash_entries:
+                    hash_store.put_many(new_hash_entries, hash_type, hash_size)
+
+                results[keyword] = count_dict
+
+        finally:
+            keyword_executor.shutdown(wait=True)
+            progress_bar.close()
+            if not session_pool: browser_pool.close()
+            if hash_store is not None: hash_store.close()
+            if url_cache is not None: url_cache.close()
+
+        # Merge the summaries in the order of the keywords
+        summary_dict = {keyword: results[keyword] for keyword in keywords_dict.keys()}
+
+        if shard_dir:
+            with stats.timer('pack'):
+                self.pack_shards(output_dir, shard_dir)
+
+        self._check(keywords_dict, output_dir, summary_dict, check_type="Final")
+        self.summary_dict = summary_dict
+
+        for keyword, count_dict in summary_dict.items():
+            stats.count('Final', count_dict['Final'], keyword)
+            stats.finish_keyword(keyword)
+
+        stats.extra['Connections'] = self.connection_stats()
+        if url_cache is not None: stats.extra['URL cache'] = dict(url_cache_stats)
+        stats.finish()
+
+        if verbose: self._print_download_summary(stats, datetime.now() - start_time)
+
+        return stats
+
+    def _print_download_summary(self, stats, time_taken):
+
+        '''
+        Print the summary of a download() run.
+
+        Parameters:
+        -----------
+            - stats (RunStats): Stats of the run
+            - time_taken (timedelta): Wall time of the run
+
+        Returns:
+        --------
+        None
+        '''
+
+        print(self.PRINT_FORMAT["1_NEWLINE"])
+        print(self.PRINT_FORMAT["LINE"]["SYMBOL"]*self.PRINT_FORMAT["LINE"]["LENGTH"],
+            end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        print('[INFO] Total time taken (hh:mm:ss.ms) {}'.format(time_taken),
+            end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        print(self.PRINT_FORMAT["LINE"]["SYMBOL"]*self.PRINT_FORMAT["LINE"]["LENGTH"],
+            end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        print("[SUMMARY] Summary of downloaded images:", end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        summary_list = [[key]+list(value.counts.values()) for key, value in stats.keywords.items()]
+        headers = ['Keyword']+list(list(stats.keywords.values())[0].counts.keys())
+        from tabulate import tabulate
+        print(tabulate(summary_list, headers=headers), end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        print("[SUMMARY] Seconds per stage (summed over the workers): {}".format(" | ".join("{} {:.2f}".format(stage, seconds)
+            for stage, seconds in stats.timings.items())), end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        if stats.failures:
+            print("[SUMMARY] Failures: {}".format(" | ".join("{} {}".format(reason, count) for reason, count in stats.failures.items())),
+                end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        connection_stats = stats.extra['Connections']
+        print("[SUMMARY] Connections: {} requests | {} new | {} reused".format(connection_stats['requests'],
+            connection_stats['new_connections'], connection_stats['reused_connections']), end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        if 'URL cache' in stats.extra:
+            print("[SUMMARY] URL cache: {} hits | {} misses".format(stats.extra['URL cache']['hits'], stats.extra['URL cache']['misses']),
+                end=self.PRINT_FORMAT["2_NEWLINE"])
+
+        print(self.PRINT_FORMAT["LINE"]["SYMBOL"]*self.PRINT_FORMAT["LINE"]["LENGTH"],
+            end=self.PRINT_FORMAT["2_NEWLINE"])
+
+    def iter_images(self, keywords, max_limit=10, image_formats={'.jpg', '.jpeg', '.png'}, remove_duplicates=False, max_workers=8,
+                    max_bytes=10 * 1024 * 1024, hash_type='dhash', hash_size=8, max_distance=0, url_extraction='auto',
+                    resize=None, grayscale=False, stages=None, output='image'):
+
+        '''
+        Stream the images of the given keyword(s) as they are fetched and validated, without writing
+        anything to disk, e.g. straight into a training or indexing job. Keywords are streamed one
+        after the other, in order; within a keyword the images come in the order of the result page.
+
+        The stream has backpressure: fetching only runs ahead of the consumer by
+        max_workers * DOWNLOAD_WINDOW_FACTOR images (and harvesting by min(URL_QUEUE_SIZE, max_limit) urls), so
+        memory stays bounded however slowly the images are consumed. Resizing, grayscaling and the
+        custom stages run in the download worker threads, duplicates are removed on the stream.
+        Breaking out of the loop (or closing the generator) stops harvesting and fetching.
+
+        Parameters:
+        -----------
+            - keywords (str / dict): Keywords for which images are streamed
+            - max_limit (int): Maximum number of images per keyword
+            - image_formats (set): Supported image formats
+            - remove_duplicates (boolean): Whether to drop duplicate images of a keyword from the stream
+            - max_workers (int): Number of images fetched concurrently
+            - max_bytes (int): Maximum size of an image in bytes
+            - hash_type (str): Perceptual hash used to find duplicates, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates. 0 means identical hashes.
+            - url_extraction (str): 'page_data', 'click' or 'auto', as for download()
+            - resize (tuple): Image size to resize, (width, height)
+            - grayscale (boolean): Whether to convert the images to grayscale
+            - stages (list): Custom easy_images.stages.Stage objects, run after resize and grayscale. A stage returning None drops the image.
+            - output (str): 'image' yields decoded images (numpy arrays), 'bytes' yields the encoded images (encoded again if a
+              stage changed them)
+
+        Returns:
+        --------
+        Images (generator): (keyword, url, image, metadata) records. Metadata holds the number of the image within the keyword
+        ('index'), its format, sha256 and byte size as downloaded, its perceptual hash (with remove_duplicates) and the width,
+        height and channels of the yielded image. The generator returns the RunStats of the stream, which are also sent to
+        the hooks.
+        '''
+
+        if output not in ('image', 'bytes'):
+            raise ValueError("output must be 'image' or 'bytes', got '{}'".format(output))
+
+        stats = RunStats('iter_images', self.hooks, self.logger)
+        self._open_download_resources()
+
+        options = DownloadOptions(None, frozenset(image_formats), max_bytes, hash_type, hash_size, max_distance, url_extraction)
+
+        # Make the keyword dict e.g {"dog": 10, "cat": 10} from "dog, cat"
+        if isinstance(keywords, str):
+            keywords_dict = {str(item).strip():max_limit for item in keywords.split(',')}
+        else:
+            keywords_dict = keywords
+
+        image_stages = []
+        if resize: image_stages.append(Resize(resize))
+        if grayscale: image_stages.append(Grayscale())
+        image_stages.extend(stages or [])
+
+        # Reuse the browsers of an open session, otherwise start a browser for this stream only
+        session_pool = self.browser_pool is not None
+        browser_pool = self.browser_pool if session_pool else BrowserPool(self.driver_factory, 1, health_check=self._browser_alive, logger=self.logger)
+
+        try:
+            for keyword, keyword_limit in keywords_dict.items():
+                for name in ('Found', 'Yielded', 'Duplicates', 'Dropped', 'Failed'):
+                    stats.count(name, 0, keyword)
+
+                yield from self._iter_keyword_images(browser_pool, keyword, keyword_limit, options, remove_duplicates, max_workers,
+                                                     image_stages, output, stats)
+                stats.finish_keyword(keyword)
+
+        finally:
+            if not session_pool: browser_pool.close()
+            stats.finish()
+
+        return stats
+
+    def _iter_keyword_images(self, browser_pool, keyword, max_limit, options, remove_duplicates=False, max_workers=8, image_stages=(),
+                             output='image', stats=None):
+
+        '''
+        Stream the images of one keyword, see iter_images.
+
+        Parameters:
+        -----------
+            - browser_pool (BrowserPool): Pool of browsers
+            - keyword (str): Keyword for which images are streamed
+            - max_limit (int): Maximum number of images needed
+            - options (DownloadOptions): Options of the iter_images() call
+            - remove_duplicates (boolean): Whether to drop duplicate images from the stream
+            - max_workers (int): Number of concurrent fetches
+            - image_stages (list): easy_images.stages.Stage objects, applied in order in the worker threads
+            - output (str): 'image' or 'bytes'
+            - stats (RunStats): Stats of the stream
+
+        Returns:
+        --------
+        Images (generator): (keyword, url, image, metadata) records
+        '''
+
+        harvest_stats = {'Found': 0, 'Cached': 0, 'urls': [], 'browser_used': False}
+        image_hash_index = HashIndex(options.max_distance, options.hash_size * options.hash_size) if remove_duplicates else None
+        content_hashes = set() if remove_duplicates else None
+        image_number = 0
+
+        fetch = partial(self._fetch_and_transform, options=options, hash_image=remove_duplicates, image_stages=image_stages,
+                        output=output, stats=stats, keyword=keyword)
+        image_url_stream = self._stream_image_urls(browser_pool, self._search_url(keyword), keyword, max_limit, harvest_stats,
+                                                   stats=stats, url_extraction=options.url_extraction)
+
+        try:
+            with closing(self._fetch_in_order(image_url_stream, fetch, max_workers, lambda: max_limit - image_number)) as fetched_images:
+
+                for image_url, result, error in fetched_images:
+
+                    if error is not None:
+                        self.logger.error("[ERROR] %s", error)
+                        stats.count('Failed', keyword=keyword)
+                        stats.add_failure(failure_reason(error), keyword, error)
+                        continue
+
+                    image, metadata = result
+
+                    if image is None:
+                        stats.count('Dropped', keyword=keyword)
+                        continue
+
+                    # Urls stand for the paths in the hash index, nothing is written
+                    if remove_duplicates and self._remove_duplicates(metadata['hash'], image_url, image_hash_index,
+                                                                     metadata['sha256'], content_hashes):
+                        stats.count('Duplicates', keyword=keyword)
+                        continue
+
+                    image_number += 1
+                    metadata['index'] = image_number
+                    stats.count('Yielded', keyword=keyword)
+
+                    yield keyword, image_url, image, metadata
+
+        finally:
+            image_url_stream.close()
+            stats.count('Found', harvest_stats['Found'], keyword)
+
+    def _fetch_and_transform(self, image_url, options, hash_image=False, image_stages=(), output='image', stats=None, keyword=None):
+
+        '''
+        Fetch an image into memory and run it through the stages, inside a download worker thread.
+
+        Parameters:
+        -----------
+            - image_url (str): Url of the image
+            - options (DownloadOptions): Options of the iter_images() call
+            - hash_image (boolean): Whether to compute the perceptual hash, for removing duplicates
+            - image_stages (list): easy_images.stages.Stage objects, applied in order
+            - output (str): 'image' returns the decoded image, 'bytes' the encoded one
+            - stats (RunStats): Run stats, gets the stage timings
+            - keyword (str): Keyword of the image, for the stats
+
+        Returns:
+        --------
+        (image, metadata) (tuple): Decoded image or bytes, None if a stage dropped the image, and the metadata of the image
+        '''
+
+        data, file_format, content_hash, image_hash, original = self._fetch_image(image_url, options, hash_image, stats, keyword, keep_image=True)
+        image = original
+
+        if image_stages:
+            with stats.timer('transform', keyword):
+                for stage in image_stages:
+                    image = stage(image, image_url)
+                    if image is None: break
+
+        metadata = {'format': file_format, 'sha256': content_hash, 'bytes': len(data), 'hash': image_hash}
+        if image is None:
+            return None, metadata
+
+        metadata.update({'width': image.shape[1], 'height': image.shape[0], 'channels': 1 if image.ndim == 2 else image.shape[2]})
+
+        if output == 'image':
+            return image, metadata
+
+        if image is not original:
+            with stats.timer('encode', keyword):
+                encoded, encoded_data = cv2.imencode(file_format, image)
+            if not encoded: raise FetchError("Can not encode the image from {}".format(image_url), 'encode_error')
+            data = encoded_data.tobytes()
+
+        return data, metadata
+
+    ##########################################################################################
+    ##########################################################################################
+    # Extra Functionalities
+
+    def _map_images(self, function, image_paths, workers=1, desc='Processing images', colour="green", **kwargs):
+
+        '''
+        Run a chunk function of easy_images.workers over the given images, serially or in a pool of
+        worker processes. Chunks keep the inter-process overhead low; results come back in the
+        order of the images, and errors are logged here in the main process.
+
+        Parameters:
+        -----------
+            - function (callable): Chunk function taking a list of image paths and returning (image_path, value, error) tuples
+            - image_paths (list): Paths of the images
+            - workers (int): Number of worker processes. 1 runs in the current process, None uses all the cores.
+            - desc (str): Progress bar description
+            - colour (str): Progress bar colour
+            - kwargs: Extra arguments for the chunk function
+
+        Returns:
+        --------
+        Results (generator): (image_path, value) for every image without error
+        '''
+
+        function = partial(function, **kwargs)
+        chunks = [image_paths[index:index + self.IMAGE_CHUNK_SIZE] for index in range(0, len(image_paths), self.IMAGE_CHUNK_SIZE)]
+        workers = os.cpu_count() if workers is None else max(1, int(workers))
+
+        executor = None
+        if workers > 1 and len(chunks) > 1:
+            executor = ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=image_workers.init_worker)
+
+        try:
+            chunk_results = executor.map(function, chunks) if executor is not None else map(function, chunks)
+
+            with tqdm(total=len(image_paths), desc = '[INFO] {}'.format(desc), colour=colour) as progress_bar:
+                for results in chunk_results:
+                    for image_path, value, error in results:
+                        progress_bar.update(1)
+                        if error is not None:
+                            self.logger.error("[ERROR] %s", error)
+                        else:
+                            yield image_path, value
+        finally:
+            if executor is not None: executor.shutdown(wait=True)
+
+    def _hash_directory(self, image_dir, hash_type='dhash', hash_size=8, desc='Hashing images', colour="red", recursive=False, hash_store=None, workers=1):
+
+        '''
+        Decode and hash all the images present in a directory, in chunks. With a hash store, images
+        whose path, modification time and size are unchanged are not decoded again.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - hash_type (str): Perceptual hash, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - desc (str): Progress bar description
+            - colour (str): Progress bar colour
+            - recursive (boolean): Whether to include the images of all the sub-directories
+            - hash_store (HashStore): Persistent hash index, None to hash every image
+            - workers (int): Number of worker processes. 1 runs in the current process, None uses all the cores.
+
+        Returns:
+        --------
+        (hashed_paths, unreadable_paths) (tuple): List of (image_path, hash) pairs and list of paths which could not be decoded
+        '''
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+        image_paths = self._list_images(image_dir, recursive)
+
+        image_hash_dict = {}
+        file_keys = {}
+
+        if hash_store is not None:
+            stored_hashes = hash_store.load(hash_type, hash_size)
+            for image_path in image_paths:
+                file_key = HashStore.file_key(image_path)
+                stored_hash = stored_hashes.get(file_key[0])
+                if stored_hash is not None and stored_hash[:2] == file_key[1:]:
+                    image_hash_dict[image_path] = stored_hash[2]
+                else:
+                    file_keys[image_path] = file_key
+
+        new_image_paths = [image_path for image_path in image_paths if image_path not in image_hash_dict]
+
+        for image_path, image_hash in self._map_images(image_workers.hash_images, new_image_paths, workers,
+                desc='{} for "{}"'.format(desc, image_dir_name), colour=colour, hash_type=hash_type, hash_size=hash_size):
+            image_hash_dict[image_path] = image_hash
+
+        if hash_store is not None:
+            hash_store.put_many([(file_keys[image_path], image_hash_dict[image_path])
+                                 for image_path in new_image_paths if image_path in image_hash_dict], hash_type, hash_size)
+
+        hashed_paths = [(image_path, image_hash_dict[image_path]) for image_path in image_paths if image_path in image_hash_dict]
+        unreadable_paths = [image_path for image_path in new_image_paths if image_path not in image_hash_dict]
+
+        return hashed_paths, unreadable_paths
+
+    def find_duplicates(self, image_dir, max_distance=0, hash_type='dhash', hash_size=8, recursive=False, hash_index_path=None, workers=1):
+
+        '''
+        Find clusters of duplicate and near-duplicate images present in a directory, without removing anything.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates. 0 means identical hashes.
+            - hash_type (str): Perceptual hash used to find duplicates, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - recursive (boolean): Whether to include all the sub-directories, e.g. to find duplicates across all the keywords of an output directory
+            - hash_index_path (str): Path of a persistent hash index (SQLite file). Only new or changed images are hashed again.
+            - workers (int): Number of worker processes decoding and hashing images. 1 runs in the current process, None uses all the cores.
+
+        Returns:
+        --------
+        Clusters (list): List of duplicate clusters (lists of image paths). The first image of a cluster is the one to keep.
+        '''
+
+        hash_store = HashStore(hash_index_path) if hash_index_path else None
+
+        try:
+            hashed_paths, _ = self._hash_directory(image_dir, hash_type, hash_size, desc='Finding duplicate images',
+                                                   recursive=recursive, hash_store=hash_store, workers=workers)
+        finally:
+            if hash_store is not None: hash_store.close()
+
+        return cluster_hashes(hashed_paths, max_distance, hash_size * hash_size)
+
+    def remove_duplicates(self, image_dir, max_distance=0, hash_type='dhash', hash_size=8, recursive=False, hash_index_path=None, workers=1):
+
+        '''
+        Remove the duplicate images present in a directory.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates. 0 means identical hashes.
+            - hash_type (str): Perceptual hash used to find duplicates, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - recursive (boolean): Whether to include all the sub-directories, e.g. to find duplicates across all the keywords of an output directory
+            - hash_index_path (str): Path of a persistent hash index (SQLite file). Only new or changed images are hashed again.
+            - workers (int): Number of worker processes decoding and hashing images. 1 runs in the current process, None uses all the cores.
+
+        Returns:
+        --------
+        Clusters (list): List of duplicate clusters (lists of image paths). All but the first image of a cluster are removed.
+        '''
+
+        hash_store = HashStore(hash_index_path) if hash_index_path else None
+
+        try:
+            hashed_paths, unreadable_paths = self._hash_directory(image_dir, hash_type, hash_size, desc='Removing duplicate images',
+                                                                  recursive=recursive, hash_store=hash_store, workers=workers)
+            clusters = cluster_hashes(hashed_paths, max_distance, hash_size * hash_size)
+            removed_paths = []
+
+            for image_path in unreadable_paths + [image_path for cluster in clusters for image_path in cluster[1:]]:
+                try:
+                    os.remove(image_path)
+                    removed_paths.append(image_path)
+                except Exception as e:
+                    self.logger.error("[ERROR] %s", e)
+
+            if hash_store is not None: hash_store.remove_many(removed_paths)
+
+        finally:
+            if hash_store is not None: hash_store.close()
+
+        return clusters
+
+    def resize_and_save(self, image_dir, size=(200, 200), workers=1, mode='stretch', output_dir=None, reduced_decoding=True):
+
+        '''
+        Resize images present in a directory. Every image is decoded once for all the output sizes
+        and modes; JPEGs are decoded at 1/2, 1/4 or 1/8 of their size when that still covers the
+        largest output, which is much cheaper than a full decode followed by a large downscale.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - size (tuple / list): Image size to resize, (width, height), or a list of sizes
+            - workers (int): Number of worker processes. 1 runs in the current process, None uses all the cores.
+            - mode (str / list): 'stretch' to resize to exactly size, 'fit' to keep the aspect ratio inside size, 'crop' to
+              keep the aspect ratio and crop the center to exactly size, or a list of modes
+            - output_dir (str): Directory to write the resized images to, None to overwrite the images. With several sizes or
+              modes, every variant goes to its own sub directory, e.g. output_dir/200x200 or output_dir/200x200_crop
+            - reduced_decoding (boolean): Whether to decode JPEGs at a reduced scale
+
+        Returns:
+        --------
+        Stats (RunStats): Number of images processed and written, number of resized files ('Outputs') and of reduced
+        decodes ('Reduced decodes'), and the seconds spent per stage
+        '''
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+
+        sizes = [tuple(size)] if isinstance(size[0], (int, np.integer)) else [tuple(target_size) for target_size in size]
+        modes = [mode] if isinstance(mode, str) else list(mode)
+        variants = [Resize(target_size, target_mode) for target_size in sizes for target_mode in modes]
+
+        if output_dir is None and len(variants) > 1:
+            raise ValueError("Several sizes or modes need an output_dir, they can not all overwrite the images")
+
+        targets = []
+        for resize in variants:
+            variant_dir = output_dir
+            if output_dir is not None and len(variants) > 1:
+                variant_name = '{}x{}'.format(*resize.size)
+                if len(modes) > 1: variant_name = '{}_{}'.format(variant_name, resize.mode)
+                variant_dir = os.path.join(output_dir, variant_name)
+            if variant_dir is not None: os.makedirs(variant_dir, exist_ok=True)
+            targets.append((resize, variant_dir))
+
+        image_paths = self._list_images(image_dir)
+
+        stats = self._processing_stats('resize_and_save', len(image_paths))
+        stats.count('Outputs', 0)
+        stats.count('Reduced decodes', 0)
+
+        def counted(results):
+            for image_path, info in results:
+                stats.count('Outputs', info['outputs'])
+                if info['scale'] > 1: stats.count('Reduced decodes')
+                yield image_path, info
+
+        self._collect_processing_results(counted(self._map_images(image_workers.resize_images, image_paths, workers,
+                desc='Resizing images with {} for "{}"'.format(', '.join('{}x{}'.format(*target_size) for target_size in sizes), image_dir_name),
+                colour="#2554C7", targets=targets, reduced_decoding=reduced_decoding)), stats)
+
+        return stats.finish()
+
+    def to_grayscale(self, image_dir, workers=1):
 
-        heights = np.array(heights)
-        widths = np.array(widths)
-        print("[OUTPUT] Total number of images: {}".format(len(heights)))
-        print("[OUTPUT] Mean height: {} | Mean width: {}".format(heights.mean(), widths.mean()))
+        '''
+        Convert images present in a directory to grayscale.
 
-    def post_processing(self, image_dir, remove_duplicates=False, resize=None, grayscale=False, avg_image_size=False):
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - workers (int): Number of worker processes. 1 runs in the current process, None uses all the cores.
 
+        Returns:
+        --------
+        Stats (RunStats): Number of images processed and written, and the seconds spent per stage
         '''
-        Perform various image post processing operations in one go.
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+        image_paths = self._list_images(image_dir)
+
+        stats = self._processing_stats('to_grayscale', len(image_paths))
+        self._collect_processing_results(self._map_images(image_workers.process_images, image_paths, workers,
+                desc='Grayscaling images for "{}"'.format(image_dir_name), colour="#778899", stages=[Grayscale()]), stats)
+
+        return stats.finish()
+
+    def calculate_avg_image_size(self, image_dir, workers=1):
+
+        '''
+        Calculate the image size stats of the images present in a directory. Width, height, channels
+        and format are read from the JPEG / PNG / WebP / GIF / BMP headers without decoding pixels;
+        only images of other formats are decoded.
 
         Parameters:
         -----------
             - image_dir (str): Path of the directory having images
+            - workers (int): Number of worker processes decoding the images without a known header. 1 runs in the current process, None uses all the cores.
+
+        Returns:
+        --------
+        Stats (ImageSizeStats): Mean, median, percentiles, size histogram, formats and channels of the images
+        '''
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+        image_paths = self._list_images(image_dir)
+
+        headers = []
+        undecoded_paths = []
+
+        for image_path in tqdm(image_paths, desc = '[INFO] Calculating average image size for "{}"'.format(image_dir_name), colour="#E2F516"):
+            try:
+                header = read_image_header(image_path)
+            except Exception as e:
+                self.logger.error("[ERROR] %s", e)
+                header = None
+
+            if header is None:
+                undecoded_paths.append(image_path)
+            else:
+                headers.append(header)
+
+        for _, header in self._map_images(image_workers.decode_image_headers, undecoded_paths, workers,
+                desc='Decoding images without a known header for "{}"'.format(image_dir_name), colour="#E2F516"):
+            headers.append(header)
+
+        return ImageSizeStats(headers, unreadable=len(image_paths) - len(headers))
+
+    def post_processing(self, image_dir, remove_duplicates=False, resize=None, grayscale=False, avg_image_size=False,
+                        hash_type='dhash', hash_size=8, max_distance=0, workers=1, stages=None):
+
+        '''
+        Perform various image post processing operations in one go. All the operations run as one
+        fused pass: every image is decoded once, hashed (to remove duplicates), resized, grayscaled
+        and passed through the custom stages in memory, written back at most once, and measured
+        for the average image size. image_dir can also be a shard directory (see pack_shards), then
+        the images are decoded straight from the shards and the shards are rewritten once.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images, or of a shard directory
             - remove_duplicates (boolean): Whether to remove duplicate images from a directory. Set remove_duplicates=True to remove duplicates.
             - resize (tuple): Image size to resize
             - grayscale (boolean): Whether to convert images in a directory,  into grayscale. Set grayscale=True to convert.
             - avg_image_size (boolean): Whether to calculate average image size of all the images in a directory. Set avg_image_size=True to calculate.
+            - hash_type (str): Perceptual hash used to find duplicates, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates. 0 means identical hashes.
+            - workers (int): Number of worker processes. 1 runs in the current process, None uses all the cores.
+            - stages (list): Custom easy_images.stages.Stage objects, run after resize and grayscale
 
         Returns:
         --------
-        None
+        Stats (RunStats): Number of images processed, written, dropped by a stage, duplicates and unreadable images removed
+        (e.g. stats['Written']), the seconds spent per stage (decode, hash, transform, write) and the image size stats
+        (ImageSizeStats) under stats['Image size'] if avg_image_size=True
+        '''
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+
+        image_stages = []
+        if resize: image_stages.append(Resize(resize))
+        if grayscale: image_stages.append(Grayscale())
+        image_stages.extend(stages or [])
+
+        if is_shard_dir(image_dir):
+            return self._post_process_shards(image_dir, remove_duplicates, image_stages, avg_image_size,
+                                             hash_type, hash_size, max_distance, workers)
+
+        image_paths = self._list_images(image_dir)
+
+        stats = self._processing_stats('post_processing', len(image_paths))
+
+        # Nothing needs the pixels, the sizes come from the image headers
+        if not (remove_duplicates or image_stages):
+            if avg_image_size:
+                with stats.timer('header'):
+                    stats.extra['Image size'] = self.calculate_avg_image_size(image_dir, workers)
+            return stats.finish()
+
+        removed_paths, image_header_dict, unreadable_paths = self._collect_processing_results(
+            self._map_images(image_workers.process_images, image_paths, workers,
+                desc='Post processing images for "{}"'.format(image_dir_name), colour="#2554C7", stages=image_stages,
+                hash_type=hash_type if remove_duplicates else None, hash_size=hash_size),
+            stats, remove_duplicates, max_distance, hash_size)
+
+        with stats.timer('remove'):
+            for image_path in removed_paths:
+                try:
+                    os.remove(image_path)
+                except Exception as e:
+                    self.logger.error("[ERROR] %s", e)
+                    stats.add_failure(failure_reason(e), error=e)
+
+        if avg_image_size:
+            stats.extra['Image size'] = ImageSizeStats(list(image_header_dict.values()), unreadable=len(unreadable_paths))
+
+        return stats.finish()
+
+    def _processing_stats(self, name, number_of_images):
+
+        '''
+        Stats of a post processing run, with the counts in the order of the summary.
+
+        Parameters:
+        -----------
+            - name (str): Name of the run
+            - number_of_images (int): Number of images to process
+
+        Returns:
+        --------
+        Stats (RunStats): Stats of the run
+        '''
+
+        stats = RunStats(name, self.hooks, self.logger)
+        stats.count('Images', number_of_images)
+        for count_name in ('Written', 'Dropped', 'Duplicates', 'Unreadable'):
+            stats.count(count_name, 0)
+
+        return stats
+
+    def _collect_processing_results(self, results, stats, remove_duplicates=False, max_distance=0, hash_size=8):
+
+        '''
+        Gather the results of a fused post processing pass: count the written and dropped images,
+        add up the stage timings of the workers and find the duplicates and unreadable images to remove.
+
+        Parameters:
+        -----------
+            - results (iterable): (item, info) pairs from process_images or process_shard_records
+            - stats (RunStats): Post processing stats, updated in place
+            - remove_duplicates (boolean): Whether duplicates and unreadable images are removed. Unreadable images are counted either way.
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates
+            - hash_size (int): Size of hash
+
+        Returns:
+        --------
+        (removed_items, image_header_dict, unreadable_items) (tuple): Items to remove, headers of the kept items
+        and items which could not be decoded
+        '''
+
+        hashed_items = []
+        image_header_dict = {}
+        removed_items = []
+        unreadable_items = []
+        written_items = []
+        timings = defaultdict(float)
+
+        for item, info in results:
+
+            for stage, seconds in info['timings'].items():
+                timings[stage] += seconds
+
+            if info['unreadable']:
+                unreadable_items.append(item)
+                continue
+
+            if info['written']: written_items.append(item)
+
+            if info['dropped_by'] is not None:
+                stats.count('Dropped')
+                removed_items.append(item)
+                continue
+
+            if info['hash'] is not None: hashed_items.append((item, info['hash']))
+            image_header_dict[item] = info['header']
+
+        stats.add_times(dict(timings))
+        stats.count('Unreadable', len(unreadable_items))
+
+        if remove_duplicates:
+            with stats.timer('cluster'):
+                duplicate_items = [item for cluster in cluster_hashes(hashed_items, max_distance, hash_size * hash_size)
+                                   for item in cluster[1:]]
+            stats.count('Duplicates', len(duplicate_items))
+            removed_items.extend(unreadable_items + duplicate_items)
+
+        for item in removed_items:
+            image_header_dict.pop(item, None)
+
+        # Duplicates are only found once all the images are hashed, their writes are undone by the removal
+        removed_set = set(removed_items)
+        stats.count('Written', sum(1 for item in written_items if item not in removed_set))
+
+        return removed_items, image_header_dict, unreadable_items
+
+    def _post_process_shards(self, shard_dir, remove_duplicates=False, image_stages=(), avg_image_size=False,
+                             hash_type='dhash', hash_size=8, max_distance=0, workers=1):
+
+        '''
+        Fused post processing over a shard directory. The workers decode the images straight from
+        the memory mapped shards; if any image changed or is removed, the shards are rewritten once
+        into a new directory which then replaces the old one. Unchanged images are copied from the
+        mapped shards without decoding.
+
+        Parameters:
+        -----------
+            - shard_dir (str): Directory of the shards
+            - remove_duplicates (boolean): Whether to remove duplicate and unreadable images
+            - image_stages (list): easy_images.stages.Stage objects, applied in order
+            - avg_image_size (boolean): Whether to calculate the image size stats
+            - hash_type (str): Perceptual hash used to find duplicates, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+            - max_distance (int): Maximum number of differing hash bits for two images to be duplicates
+            - workers (int): Number of worker processes. 1 runs in the current process, None uses all the cores.
+
+        Returns:
+        --------
+        Stats (RunStats): Same as post_processing
+        '''
+
+        shard_dir_name = shard_dir.split("/")[-1]
+        if not shard_dir_name: shard_dir_name = shard_dir.split("/")[-2]
+        shard_dir = shard_dir.rstrip("/")
+
+        reader = ShardReader(shard_dir)
+        stats = self._processing_stats('post_processing', len(reader))
+        encoded_images = {}
+
+        def results():
+            for key, info in self._map_images(image_workers.process_shard_records, reader.records, workers,
+                    desc='Post processing shards of "{}"'.format(shard_dir_name), colour="#2554C7", shard_dir=shard_dir,
+                    stages=image_stages, hash_type=hash_type if remove_duplicates else None, hash_size=hash_size):
+                if info['data'] is not None: encoded_images[key] = info.pop('data')
+                yield key, info
+
+        try:
+            removed_keys, image_header_dict, unreadable_keys = self._collect_processing_results(
+                results(), stats, remove_duplicates, max_distance, hash_size)
+
+            if removed_keys or encoded_images:
+                write_time = time.perf_counter()
+                removed_keys = set(removed_keys)
+                new_shard_dir = "{}.{}.tmp".format(shard_dir, uuid.uuid4().hex)
+                # Keep shards of about the same size as the original ones
+                max_shard_bytes = max(os.path.getsize(os.path.join(shard_dir, shard_name))
+                                      for shard_name in {record['shard'] for record in reader.records})
+
+                with ShardWriter(new_shard_dir, max_shard_bytes) as writer:
+                    for index, record in enumerate(reader.records):
+                        if record['key'] in removed_keys: continue
+
+                        metadata = {name: value for name, value in record.items()
+                                    if name not in ('key', 'label', 'format', 'shard', 'offset', 'size')}
+                        data = encoded_images.get(record['key'])
+                        writer.add(record['key'], reader[index] if data is None else data, record['format'],
+                                   record['label'], metadata)
+
+                stats.add_times({'write': time.perf_counter() - write_time})
+
+        finally:
+            reader.close()
+
+        if removed_keys or encoded_images:
+            old_shard_dir = "{}.{}.old".format(shard_dir, uuid.uuid4().hex)
+            os.replace(shard_dir, old_shard_dir)
+            os.replace(new_shard_dir, shard_dir)
+            shutil.rmtree(old_shard_dir)
+
+        if avg_image_size:
+            stats.extra['Image size'] = ImageSizeStats(list(image_header_dict.values()), unreadable=len(unreadable_keys))
+
+        return stats.finish()
+
+    def _image_labels(self, image_dir, image_paths):
+
+        '''
+        Label and metadata of the images of a directory: the label is the keyword sub-directory of
+        the image (or the directory name for a flat directory), and the source url is taken from
+        the manifest of the keyword directory when there is one.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - image_paths (list): Paths of the images inside image_dir
+
+        Returns:
+        --------
+        Labels (dict): Image path -> (label, metadata)
+        '''
+
+        image_dir_name = os.path.basename(os.path.normpath(image_dir))
+        manifest_urls = {}
+        labels = {}
+
+        for image_path in image_paths:
+            directory = os.path.dirname(image_path)
+            label = os.path.relpath(directory, image_dir)
+            if label == '.': label = image_dir_name
+
+            if directory not in manifest_urls:
+                manifest_urls[directory] = {record['file']: record['url'] for record in Manifest.read_records(directory)
+                                            if record['status'] == Manifest.STATUS_DOWNLOADED}
+
+            metadata = {'source': os.path.relpath(image_path, image_dir)}
+            url = manifest_urls[directory].get(os.path.basename(image_path))
+            if url is not None: metadata['url'] = url
+
+            labels[image_path] = (label, metadata)
+
+        return labels
+
+    def pack_shards(self, image_dir, shard_dir, max_shard_bytes=256 * 1024 * 1024):
+
+        '''
+        Pack the images of a directory (e.g. the output directory of download(), with one
+        sub-directory per keyword) into tar shards with an index, for fast sequential and random
+        reads. The keyword is stored as the label of every image. Read them back with
+        easy_images.shards.ShardReader.
+
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - shard_dir (str): Directory of the shards
+            - max_shard_bytes (int): Size from which a new shard is started
+
+        Returns:
+        --------
+        Count (int): Number of images packed
+        '''
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+        image_paths = [image_path for image_path in self._list_images(image_dir, recursive=True) if self._is_image_file(image_path)]
+        labels = self._image_labels(image_dir, image_paths)
+
+        with ShardWriter(shard_dir, max_shard_bytes) as writer:
+            for image_path in tqdm(image_paths, desc = '[INFO] Packing shards for "{}"'.format(image_dir_name), colour="#2554C7"):
+                try:
+                    label, metadata = labels[image_path]
+                    stem, file_format = os.path.splitext(metadata['source'])
+                    with open(image_path, 'rb') as file:
+                        writer.add(stem.replace('.', '_'), file.read(), file_format.lower(), label, metadata)
+                except Exception as e:
+                    self.logger.error("[ERROR] %s", e)
+
+            return len(writer.records)
+
+    def pack_array(self, image_dir, output_dir, size=(200, 200), grayscale=False, workers=1):
+
         '''
+        Resize the images of a directory (e.g. the output directory of download()) to a fixed
+        shape and store them as one memory mapped NumPy array with a label table. Read them back
+        with easy_images.shards.load_image_array.
 
-        if remove_duplicates: self.remove_duplicates(image_dir=image_dir)
-        if resize: self.resize_and_save(image_dir=image_dir, size=resize)
-        if grayscale: self.to_grayscale(image_dir=image_dir)
-        if avg_image_size: self.calculate_avg_image_size(image_dir=image_dir)
+        Parameters:
+        -----------
+            - image_dir (str): Path of the directory having images
+            - output_dir (str): Directory of the array (images.npy) and its label table (labels.jsonl)
+            - size (tuple): Image size to resize, (width, height)
+            - grayscale (boolean): Whether to store grayscale images
+            - workers (int): Number of worker processes decoding and resizing. 1 runs in the current process, None uses all the cores.
+
+        Returns:
+        --------
+        Count (int): Number of images stored
+        '''
+
+        image_dir_name = image_dir.split("/")[-1]
+        if not image_dir_name: image_dir_name = image_dir.split("/")[-2]
+        image_paths = [image_path for image_path in self._list_images(image_dir, recursive=True) if self._is_image_file(image_path)]
+        labels = self._image_labels(image_dir, image_paths)
+
+        image_stages = [Resize(size)]
+        if grayscale: image_stages.append(Grayscale())
+
+        writer = ImageArrayWriter(output_dir, len(image_paths), size, channels=1 if grayscale else 3)
+
+        try:
+            for image_path, image in self._map_images(image_workers.transform_images, image_paths, workers,
+                    desc='Packing an image array for "{}"'.format(image_dir_name), colour="#2554C7", stages=image_stages):
+                label, metadata = labels[image_path]
+                writer.add(image, metadata['source'], label, metadata)
+        finally:
+            writer.close()
+
+        return len(writer.records)
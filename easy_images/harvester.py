@@ -0,0 +1,293 @@
+import json
+import logging
+import re
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from tqdm import tqdm
+
+
+# Full resolution entries of the result data embedded in the page scripts: ["url",height,width]
+EMBEDDED_IMAGE_PATTERN = re.compile(r'\["(https?://(?:[^"\\]|\\.)+?)",(\d+),(\d+)\]')
+# Older result pages keep the original url in the rg_meta JSON of every result: "ou":"url"
+META_IMAGE_PATTERN = re.compile(r'"ou":"(https?://(?:[^"\\]|\\.)+?)"')
+# Thumbnails and other images served by Google itself
+GOOGLE_IMAGE_PATTERN = re.compile(r'^https?://(?:[^/]*\.)?(?:gstatic|google|googleusercontent)\.com/')
+
+EXTRACTION_MODES = ('auto', 'page_data', 'click')
+
+
+def extract_image_urls(html):
+
+    '''
+    Extract the full resolution image urls from the data embedded in a Google Images result page,
+    in one pass over the page source and without clicking any thumbnail.
+
+    Parameters:
+    -----------
+        - html (str): Page source of the result page
+
+    Returns:
+    --------
+    image_url_list (list): Unique image urls, in the order of the page
+    '''
+
+    image_url_list = []
+    seen_urls = set()
+
+    matches = [(match.start(), match.group(1)) for match in EMBEDDED_IMAGE_PATTERN.finditer(html)]
+    matches.extend((match.start(), match.group(1)) for match in META_IMAGE_PATTERN.finditer(html))
+
+    for _, image_url in sorted(matches):
+        try:
+            # Urls are JS string literals, e.g. with \u003d for '='
+            image_url = json.loads('"{}"'.format(image_url))
+        except ValueError:
+            continue
+
+        if GOOGLE_IMAGE_PATTERN.match(image_url) or image_url in seen_urls: continue
+        seen_urls.add(image_url)
+        image_url_list.append(image_url)
+
+    return image_url_list
+
+
+def wait_until(condition, timeout, poll_interval=0.05, clock=time.monotonic, sleep=time.sleep):
+
+    '''
+    Poll a condition until it returns a truthy value or the timeout expires.
+
+    Parameters:
+    -----------
+        - condition (callable): Function without arguments, polled until its result is truthy
+        - timeout (float): Maximum number of seconds to wait
+        - poll_interval (float): Seconds between two polls
+        - clock (callable): Monotonic clock, replaceable in tests
+        - sleep (callable): Sleep function, replaceable in tests
+
+    Returns:
+    --------
+    Result (object): Last result of the condition, falsy if the timeout expired
+    '''
+
+    deadline = clock() + timeout
+
+    while True:
+        result = condition()
+        if result or clock() >= deadline:
+            return result
+        sleep(poll_interval)
+
+
+class GoogleImagesHarvester:
+
+    SCROLL_ELEMENT_ID = 'yDmH0d'
+    THUMBNAIL_SELECTOR = 'img.rg_i.Q4LuWd'
+    PREVIEW_SELECTOR = 'img.n3VNCb'
+    SHOW_MORE_CLASS = 'mye4qd'
+
+    def __init__(self, browser, page_loading_timeout=2, preview_timeout=0.5, poll_interval=0.05, max_scroll_number=160,
+                 url_surplus_factor=1.5, extraction='auto', logger=None, clock=time.monotonic, sleep=time.sleep):
+
+        '''
+        Collect image urls from a Google Images result page with condition-driven waits: the
+        harvester polls for new thumbnails and preview images instead of sleeping for fixed
+        times, and stops scrolling once enough thumbnails are loaded or their count plateaus.
+
+        The browser only needs the small part of the Selenium WebDriver API used here (get,
+        find_element, find_elements and elements with click, send_keys, get_attribute and
+        is_displayed), so a fake driver can replay saved pages in tests and benchmarks.
+
+        Parameters:
+        -----------
+            - browser (WebDriver): Selenium WebDriver or a compatible fake
+            - page_loading_timeout (float): Maximum seconds to wait for the page or for new thumbnails after a scroll
+            - preview_timeout (float): Maximum seconds to wait for the full image url after clicking a thumbnail
+            - poll_interval (float): Seconds between two polls of the page
+            - max_scroll_number (int): Maximum number of scrolls per page
+            - url_surplus_factor (float): Collect max_limit * url_surplus_factor urls, as some downloads fail
+            - extraction (str): 'page_data' reads all the urls from the data embedded in the page in one pass,
+              'click' clicks every thumbnail and reads its preview, 'auto' reads the page data first and
+              clicks thumbnails only when more urls are needed
+            - logger (Logger): Logger for the errors
+            - clock (callable): Monotonic clock, replaceable in tests
+            - sleep (callable): Sleep function, replaceable in tests
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.browser = browser
+        self.page_loading_timeout = page_loading_timeout
+        self.preview_timeout = preview_timeout
+        self.poll_interval = poll_interval
+        self.max_scroll_number = max_scroll_number
+        self.url_surplus_factor = url_surplus_factor
+        self.logger = logger or logging.getLogger(__name__)
+
+        if extraction not in EXTRACTION_MODES:
+            raise ValueError("Unknown extraction mode '{}', expected one of {}".format(extraction, EXTRACTION_MODES))
+        self.extraction = extraction
+        self.clock = clock
+        self.sleep = sleep
+
+    def _wait_until(self, condition, timeout):
+
+        return wait_until(condition, timeout, self.poll_interval, self.clock, self.sleep)
+
+    def _thumbnails(self):
+
+        return self.browser.find_elements(By.CSS_SELECTOR, self.THUMBNAIL_SELECTOR)
+
+    def _preview_urls(self):
+
+        '''
+        Read the full image urls from the preview panel only, instead of parsing the whole page.
+
+        Returns:
+        --------
+        image_url_list (list): Urls of the preview images, without inline data urls
+        '''
+
+        image_url_list = []
+
+        for preview_element in self.browser.find_elements(By.CSS_SELECTOR, self.PREVIEW_SELECTOR):
+            src = preview_element.get_attribute('src')
+            if src and not src.startswith('data:'):
+                image_url_list.append(src)
+
+        return image_url_list
+
+    def _show_more(self):
+
+        '''
+        Click the "Show more results" button if it is visible.
+
+        Returns:
+        --------
+        Clicked (boolean): Whether the button was clicked
+        '''
+
+        for more_element in self.browser.find_elements(By.CLASS_NAME, self.SHOW_MORE_CLASS):
+            try:
+                if more_element.is_displayed():
+                    more_element.click()
+                    return True
+            except Exception as e:
+                self.logger.error("[ERROR] %s", e)
+
+        return False
+
+    def load(self, base_url):
+
+        '''
+        Open the result page and wait until the first thumbnails are there.
+
+        Parameters:
+        -----------
+            - base_url (str): Url of the result page
+
+        Returns:
+        --------
+        Loaded (boolean): Whether thumbnails appeared before the timeout
+        '''
+
+        self.browser.get(base_url)
+        return bool(self._wait_until(lambda: len(self._thumbnails()) > 0, self.page_loading_timeout))
+
+    def scroll(self, target_count):
+
+        '''
+        Scroll down until target_count thumbnails are loaded, or until their count stops growing
+        for page_loading_timeout seconds (after trying the "Show more results" button).
+
+        Parameters:
+        -----------
+            - target_count (int): Number of thumbnails wanted
+
+        Returns:
+        --------
+        Count (int): Number of thumbnails loaded
+        '''
+
+        scroll_element = self.browser.find_element(By.ID, self.SCROLL_ELEMENT_ID)
+        count = len(self._thumbnails())
+
+        for _ in range(self.max_scroll_number):
+            if count >= target_count: break
+
+            previous_count = count
+            scroll_element.send_keys(Keys.END)
+            grown = self._wait_until(lambda: len(self._thumbnails()) > previous_count, self.page_loading_timeout)
+
+            if not grown and self._show_more():
+                grown = self._wait_until(lambda: len(self._thumbnails()) > previous_count, self.page_loading_timeout)
+
+            count = len(self._thumbnails())
+            if not grown: break
+
+        return count
+
+    def iter_image_urls(self, base_url, keyword, max_limit, stop_event=None):
+
+        '''
+        Yield the full image urls of the given result page as soon as they are found.
+
+        Without a stop event, harvesting ends after max_limit * url_surplus_factor urls. With a stop
+        event (set by the consumer once it has accepted enough images), harvesting goes on until
+        the event is set or the thumbnails run out, and no thumbnail is clicked after that.
+
+        Parameters:
+        -----------
+            - base_url (str): Url of the result page
+            - keyword (str): Keyword of the result page, for the progress bar
+            - max_limit (int): Maximum number of images needed
+            - stop_event (threading.Event): Event telling the harvester to stop
+
+        Returns:
+        --------
+        image_urls (generator): Image urls, in the order of the thumbnails
+        '''
+
+        url_target = int(max_limit * self.url_surplus_factor) + 1
+        url_limit = url_target if stop_event is None else float('inf')
+        number_of_urls = 0
+        seen_urls = set()
+
+        def stopped():
+            return number_of_urls >= url_limit or (stop_event is not None and stop_event.is_set())
+
+        if not self.load(base_url):
+            self.logger.error("[ERROR] No thumbnails found for keyword '%s'", keyword)
+            return
+
+        self.scroll(url_target)
+
+        if self.extraction != 'click':
+            for image_url in extract_image_urls(self.browser.page_source):
+                if stopped(): return
+                seen_urls.add(image_url)
+                number_of_urls += 1
+                yield image_url
+
+        if self.extraction == 'page_data':
+            return
+
+        # The page data covers the first thumbnails, only the later ones need a click
+        for thumbnail in tqdm(self._thumbnails()[number_of_urls:], desc = "[INFO] Getting URLs for keyword '{}'".format(keyword), leave=False, colour="green"):
+
+            if stopped(): return
+
+            try:
+                thumbnail.click()
+                new_urls = self._wait_until(lambda: [url for url in self._preview_urls() if url not in seen_urls], self.preview_timeout)
+            except Exception as e:
+                self.logger.error("[ERROR] %s", e)
+                continue
+
+            for image_url in new_urls or []:
+                seen_urls.add(image_url)
+                number_of_urls += 1
+                yield image_url
@@ -0,0 +1,165 @@
+def hamming_distance(hash_a, hash_b):
+
+    '''
+    Number of differing bits between two int hashes.
+
+    Parameters:
+    -----------
+        - hash_a (int): First hash
+        - hash_b (int): Second hash
+
+    Returns:
+    --------
+    Distance (int): Hamming distance
+    '''
+
+    return bin(hash_a ^ hash_b).count('1')
+
+
+class HashIndex:
+
+    def __init__(self, max_distance=0, hash_bits=64):
+
+        '''
+        Multi-index hashing over int hashes for Hamming distance lookups. The hash bits are split
+        into max_distance + 1 substrings, each with its own lookup table. Two hashes within
+        max_distance bits must agree exactly on at least one substring (pigeonhole), so a lookup
+        only verifies the hashes sharing a substring instead of comparing against every image.
+
+        Parameters:
+        -----------
+            - max_distance (int): Maximum Hamming distance for lookups. 0 means exact hash match.
+            - hash_bits (int): Number of bits of the hashes, hash_size * hash_size
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.max_distance = max_distance
+        self.hash_bits = hash_bits
+        self.items = {}
+
+        number_of_chunks = max(1, min(max_distance + 1, hash_bits))
+        chunk_size, remainder = divmod(hash_bits, number_of_chunks)
+
+        # (shift, mask) of every substring, the first ones take one extra bit
+        self.chunks = []
+        shift = 0
+        for chunk_index in range(number_of_chunks):
+            bits = chunk_size + (1 if chunk_index < remainder else 0)
+            self.chunks.append((shift, (1 << bits) - 1))
+            shift += bits
+
+        self.tables = [{} for _ in self.chunks]
+
+    def __len__(self):
+
+        return sum(len(items) for items in self.items.values())
+
+    def add(self, image_hash, item):
+
+        '''
+        Add an item (e.g. an image path) under the given hash.
+
+        Parameters:
+        -----------
+            - image_hash (int): Hash of the item
+            - item (object): Item stored with the hash
+
+        Returns:
+        --------
+        None
+        '''
+
+        if image_hash in self.items:
+            self.items[image_hash].append(item)
+            return
+
+        self.items[image_hash] = [item]
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            table.setdefault((image_hash >> shift) & mask, []).append(image_hash)
+
+    def search(self, image_hash, max_distance=None):
+
+        '''
+        Find all the stored hashes within max_distance of the given hash.
+
+        Parameters:
+        -----------
+            - image_hash (int): Hash to look up
+            - max_distance (int): Maximum Hamming distance, at most the one of the index. Defaults to the one of the index.
+
+        Returns:
+        --------
+        Matches (list): List of (distance, hash, items) tuples sorted by distance
+        '''
+
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        if max_distance == 0:
+            items = self.items.get(image_hash)
+            return [(0, image_hash, items)] if items else []
+
+        candidates = set()
+        for (shift, mask), table in zip(self.chunks, self.tables):
+            candidates.update(table.get((image_hash >> shift) & mask, ()))
+
+        matches = []
+        for candidate in candidates:
+            distance = hamming_distance(image_hash, candidate)
+            if distance <= max_distance:
+                matches.append((distance, candidate, self.items[candidate]))
+
+        return sorted(matches, key=lambda match: match[0])
+
+    def nearest(self, image_hash, max_distance=None):
+
+        '''
+        Find the closest stored hash within max_distance of the given hash.
+
+        Parameters:
+        -----------
+            - image_hash (int): Hash to look up
+            - max_distance (int): Maximum Hamming distance. Defaults to the one of the index.
+
+        Returns:
+        --------
+        Match (tuple / None): (distance, hash, items) of the closest hash, None if nothing is close enough
+        '''
+
+        matches = self.search(image_hash, max_distance)
+        return matches[0] if matches else None
+
+
+def cluster_hashes(hashed_items, max_distance=0, hash_bits=64):
+
+    '''
+    Group items into duplicate clusters. Items are visited in order; an item joins the cluster
+    of the closest earlier representative within max_distance, otherwise it becomes the
+    representative of a new cluster. The first item of each cluster is the one to keep.
+
+    Parameters:
+    -----------
+        - hashed_items (iterable): (item, hash) pairs
+        - max_distance (int): Maximum Hamming distance between near-duplicates. 0 means exact hash match.
+        - hash_bits (int): Number of bits of the hashes, hash_size * hash_size
+
+    Returns:
+    --------
+    Clusters (list): List of clusters (lists of items), only the ones with more than one item
+    '''
+
+    index = HashIndex(max_distance, hash_bits)
+    clusters = []
+
+    for item, image_hash in hashed_items:
+        match = index.nearest(image_hash)
+        if match is None:
+            clusters.append([item])
+            index.add(image_hash, len(clusters) - 1)
+        else:
+            clusters[match[2][0]].append(item)
+
+    return [cluster for cluster in clusters if len(cluster) > 1]
@@ -0,0 +1,128 @@
+import os
+import sqlite3
+
+
+class HashStore:
+
+    def __init__(self, db_path):
+
+        '''
+        Persistent on-disk index of image hashes, stored in SQLite. A hash is keyed by the image
+        path, hash type and hash size, and is only valid while the modification time and size
+        of the file are unchanged, so re-runs only decode and hash new or changed images.
+
+        Hashes are stored as hex text, since SQLite integers are limited to signed 64 bits.
+
+        Parameters:
+        -----------
+            - db_path (str): Path of the SQLite database file
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.db_path = db_path
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir): os.makedirs(db_dir)
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS image_hashes (
+                                       path TEXT NOT NULL,
+                                       hash_type TEXT NOT NULL,
+                                       hash_size INTEGER NOT NULL,
+                                       mtime_ns INTEGER NOT NULL,
+                                       size INTEGER NOT NULL,
+                                       hash TEXT NOT NULL,
+                                       PRIMARY KEY (path, hash_type, hash_size))''')
+        self.connection.commit()
+
+    @staticmethod
+    def file_key(image_path):
+
+        '''
+        Absolute path, modification time and size of an image, which identify one version of the file.
+
+        Parameters:
+        -----------
+            - image_path (str): Path of the image
+
+        Returns:
+        --------
+        (path, mtime_ns, size) (tuple): Key of the file
+        '''
+
+        stat = os.stat(image_path)
+        return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size
+
+    def load(self, hash_type='dhash', hash_size=8):
+
+        '''
+        Load all the stored hashes of the given hash type and size.
+
+        Parameters:
+        -----------
+            - hash_type (str): Perceptual hash, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash
+
+        Returns:
+        --------
+        Hashes (dict): Absolute path -> (mtime_ns, size, hash)
+        '''
+
+        rows = self.connection.execute('SELECT path, mtime_ns, size, hash FROM image_hashes WHERE hash_type = ? AND hash_size = ?',
+                                       (hash_type, hash_size))
+
+        return {path: (mtime_ns, size, int(image_hash, 16)) for path, mtime_ns, size, image_hash in rows}
+
+    def put_many(self, entries, hash_type='dhash', hash_size=8):
+
+        '''
+        Store the hashes of many images in one transaction.
+
+        Parameters:
+        -----------
+            - entries (iterable): ((path, mtime_ns, size), hash) pairs, with keys from file_key()
+            - hash_type (str): Perceptual hash, one of 'dhash', 'ahash' or 'phash'
+            - hash_size (int): Size of hash
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO image_hashes VALUES (?, ?, ?, ?, ?, ?)',
+                [(path, hash_type, hash_size, mtime_ns, size, format(image_hash, 'x'))
+                 for (path, mtime_ns, size), image_hash in entries])
+
+    def remove_many(self, image_paths):
+
+        '''
+        Forget the hashes of the given images, e.g. after they are removed.
+
+        Parameters:
+        -----------
+            - image_paths (iterable): Paths of the images
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self.connection:
+            self.connection.executemany('DELETE FROM image_hashes WHERE path = ?',
+                [(os.path.abspath(image_path),) for image_path in image_paths])
+
+    def close(self):
+
+        '''
+        Close the database connection.
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.connection.close()
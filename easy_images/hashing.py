@@ -0,0 +1,143 @@
+import cv2
+import numpy as np
+
+HASH_TYPES = ('dhash', 'ahash', 'phash')
+
+
+def _to_gray(image):
+
+    '''
+    Convert a decoded image (gray, BGR or BGRA) to a single channel.
+
+    Parameters:
+    -----------
+        - image (numpy array): Decoded image
+
+    Returns:
+    --------
+    Gray image (numpy array): Single channel image
+    '''
+
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def _prepare(image, hash_type, hash_size):
+
+    '''
+    Reduce an image to the small matrix the hash bits are computed from.
+
+    Parameters:
+    -----------
+        - image (numpy array): Decoded image
+        - hash_type (str): One of 'dhash', 'ahash' or 'phash'
+        - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+
+    Returns:
+    --------
+    Matrix (numpy array): Resized gray image, or low frequency DCT coefficients for 'phash'
+    '''
+
+    gray = _to_gray(image)
+
+    if hash_type == 'dhash':
+        # Same resize as the original dHash, so old hash values stay comparable
+        return cv2.resize(gray, (hash_size + 1, hash_size))
+
+    if hash_type == 'ahash':
+        return cv2.resize(gray, (hash_size, hash_size), interpolation=cv2.INTER_AREA)
+
+    if hash_type == 'phash':
+        resized = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA)
+        return cv2.dct(np.float32(resized))[:hash_size, :hash_size]
+
+    raise ValueError("Unknown hash type '{}', expected one of {}".format(hash_type, HASH_TYPES))
+
+
+def _hash_bits(stack, hash_type):
+
+    '''
+    Compute the hash bits for a stack of prepared matrices in one go.
+
+    Parameters:
+    -----------
+        - stack (numpy array): Prepared matrices with shape (N, rows, columns)
+        - hash_type (str): One of 'dhash', 'ahash' or 'phash'
+
+    Returns:
+    --------
+    Bits (numpy array): Boolean array with shape (N, hash_size * hash_size)
+    '''
+
+    if hash_type == 'dhash':
+        bits = stack[:, :, 1:] > stack[:, :, :-1]
+    elif hash_type == 'ahash':
+        bits = stack > stack.mean(axis=(1, 2), keepdims=True)
+    else:
+        bits = stack > np.median(stack, axis=(1, 2), keepdims=True)
+
+    return bits.reshape(len(stack), -1)
+
+
+def pack_bits(bits):
+
+    '''
+    Pack rows of hash bits into python ints. Bit i of a row is worth 2 ** i, which matches
+    the original `sum(2 ** index ...)` dHash values.
+
+    Parameters:
+    -----------
+        - bits (numpy array): Boolean array with shape (N, number_of_bits)
+
+    Returns:
+    --------
+    Hashes (list): List of int hashes
+    '''
+
+    packed = np.packbits(bits, axis=1, bitorder='little')
+    return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+def image_hashes(images, hash_type='dhash', hash_size=8):
+
+    '''
+    Generate perceptual hashes for a batch of decoded images in one call.
+
+    Parameters:
+    -----------
+        - images (list / numpy array): List of decoded images, or a stack with shape (N, height, width[, channels])
+        - hash_type (str): One of 'dhash', 'ahash' or 'phash'
+        - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+
+    Returns:
+    --------
+    Hashes (list): List of int hashes, in the order of the images
+    '''
+
+    if len(images) == 0:
+        return []
+
+    stack = np.stack([_prepare(image, hash_type, hash_size) for image in images])
+    return pack_bits(_hash_bits(stack, hash_type))
+
+
+def image_hash(image, hash_type='dhash', hash_size=8):
+
+    '''
+    Generate perceptual hash for the given image.
+
+    Parameters:
+    -----------
+        - image (numpy array): Decoded image
+        - hash_type (str): One of 'dhash', 'ahash' or 'phash'
+        - hash_size (int): Size of hash, the hash has hash_size * hash_size bits
+
+    Returns:
+    --------
+    Hash (int): Hash generated for the given image
+    '''
+
+    return image_hashes([image], hash_type, hash_size)[0]
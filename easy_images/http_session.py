@@ -0,0 +1,129 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PooledSession:
+
+    def __init__(self, max_connections_per_host=8, max_hosts=64, retries=2, backoff_factor=0.3,
+                 connect_timeout=1, read_timeout=1, retry_status_codes=(429, 500, 502, 503, 504)):
+
+        '''
+        Shared HTTP session with keep-alive connection pooling, a cap on the number of connections
+        per host and retries with exponential backoff for transient errors.
+
+        Parameters:
+        -----------
+            - max_connections_per_host (int): Maximum number of open connections to a single host
+            - max_hosts (int): Number of host connection pools kept alive
+            - retries (int): Number of retries for connection errors and retryable status codes
+            - backoff_factor (float): Exponential backoff factor between retries (0.3 -> 0.3s, 0.6s, 1.2s ...)
+            - connect_timeout (float): Seconds to wait for a connection to be established
+            - read_timeout (float): Seconds to wait for the server to send data
+            - retry_status_codes (tuple): HTTP status codes which are retried
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.timeout = (connect_timeout, read_timeout)
+        self._lock = threading.Lock()
+        self._closed_pool_stats = {'new_connections': 0, 'requests': 0}
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=retry_status_codes,
+                      allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+
+        self.adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=max_connections_per_host,
+                                   max_retries=retry, pool_block=True)
+
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        # Keep the counters of host pools evicted from the pool manager
+        pools = self.adapter.poolmanager.pools
+        dispose_func = pools.dispose_func
+
+        def _dispose(pool):
+            self._record_pool(pool)
+            if dispose_func: dispose_func(pool)
+
+        pools.dispose_func = _dispose
+
+    def _record_pool(self, pool):
+
+        '''
+        Add the connection counters of a host pool which is about to be discarded.
+
+        Parameters:
+        -----------
+            - pool (HTTPConnectionPool): Host connection pool
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self._lock:
+            self._closed_pool_stats['new_connections'] += pool.num_connections
+            self._closed_pool_stats['requests'] += pool.num_requests
+
+    def get(self, url, **kwargs):
+
+        '''
+        Send a GET request through the pooled session.
+
+        Parameters:
+        -----------
+            - url (str): Url to fetch
+            - kwargs: Extra arguments for requests.Session.get
+
+        Returns:
+        --------
+        Response (requests.Response): Response object
+        '''
+
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('allow_redirects', True)
+        return self.session.get(url, **kwargs)
+
+    def connection_stats(self):
+
+        '''
+        Count new and reused connections over the lifetime of the session.
+
+        Returns:
+        --------
+        Stats (dict): Number of requests, new connections and reused connections
+        '''
+
+        with self._lock:
+            new_connections = self._closed_pool_stats['new_connections']
+            number_of_requests = self._closed_pool_stats['requests']
+
+        pools = self.adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None: continue
+            new_connections += pool.num_connections
+            number_of_requests += pool.num_requests
+
+        return {'requests': number_of_requests,
+                'new_connections': new_connections,
+                'reused_connections': max(0, number_of_requests - new_connections)}
+
+    def close(self):
+
+        '''
+        Close all the pooled connections.
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.session.close()
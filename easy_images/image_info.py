@@ -0,0 +1,208 @@
+import struct
+from collections import Counter, namedtuple
+
+import numpy as np
+
+ImageHeader = namedtuple('ImageHeader', ['width', 'height', 'channels', 'format'])
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+# Start of frame markers, every 0xC0 - 0xCF marker except DHT, JPG and DAC
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xDA)) | {0x01}
+
+
+def _read_jpeg_header(file):
+
+    '''
+    Walk the JPEG segments until the start of frame, skipping EXIF and other segments with seeks.
+
+    Parameters:
+    -----------
+        - file (file object): Image file opened in binary mode, positioned after the SOI marker
+
+    Returns:
+    --------
+    Header (ImageHeader / None): Header of the image, None if no start of frame is found
+    '''
+
+    while True:
+        byte = file.read(1)
+        while byte and byte != b'\xff':
+            byte = file.read(1)
+        marker = file.read(1)
+        while marker == b'\xff':
+            marker = file.read(1)
+        if not marker:
+            return None
+
+        marker = marker[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+
+        length_bytes = file.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack('>H', length_bytes)[0]
+
+        if marker in JPEG_SOF_MARKERS:
+            segment = file.read(6)
+            if len(segment) < 6:
+                return None
+            _, height, width, channels = struct.unpack('>BHHB', segment)
+            return ImageHeader(width, height, channels, 'jpeg')
+
+        file.seek(length - 2, 1)
+
+
+def _read_webp_header(data):
+
+    '''
+    Parse the first chunk of a WebP file (VP8, VP8L or VP8X).
+
+    Parameters:
+    -----------
+        - data (bytes): First bytes of the file
+
+    Returns:
+    --------
+    Header (ImageHeader / None): Header of the image, None if the chunk is not understood
+    '''
+
+    chunk = data[12:16]
+
+    if chunk == b'VP8 ' and len(data) >= 30 and data[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', data[26:30])
+        return ImageHeader(width & 0x3FFF, height & 0x3FFF, 3, 'webp')
+
+    if chunk == b'VP8L' and len(data) >= 25 and data[20] == 0x2F:
+        bits = struct.unpack('<I', data[21:25])[0]
+        channels = 4 if (bits >> 28) & 1 else 3
+        return ImageHeader((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, channels, 'webp')
+
+    if chunk == b'VP8X' and len(data) >= 30:
+        channels = 4 if data[20] & 0x10 else 3
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return ImageHeader(width, height, channels, 'webp')
+
+    return None
+
+
+def read_image_header(image_path):
+
+    '''
+    Read width, height, channels and format of an image from its header, without decoding
+    any pixels. Supports JPEG, PNG, WebP, GIF and BMP.
+
+    Parameters:
+    -----------
+        - image_path (str): Path of the image
+
+    Returns:
+    --------
+    Header (ImageHeader / None): Header of the image, None for unknown or truncated files
+    '''
+
+    with open(image_path, 'rb') as file:
+        data = file.read(32)
+
+        if data[:2] == b'\xff\xd8':
+            file.seek(2)
+            return _read_jpeg_header(file)
+
+    if data[:8] == PNG_SIGNATURE and data[12:16] == b'IHDR' and len(data) >= 26:
+        width, height, _, color_type = struct.unpack('>IIBB', data[16:26])
+        return ImageHeader(width, height, PNG_CHANNELS.get(color_type, 3), 'png')
+
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return _read_webp_header(data)
+
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+        width, height = struct.unpack('<HH', data[6:10])
+        return ImageHeader(width, height, 3, 'gif')
+
+    if data[:2] == b'BM' and len(data) >= 30:
+        width, height, _, bits_per_pixel = struct.unpack('<iiHH', data[18:30])
+        return ImageHeader(width, abs(height), max(1, bits_per_pixel // 8), 'bmp')
+
+    return None
+
+
+class ImageSizeStats:
+
+    PERCENTILES = (5, 25, 50, 75, 95)
+    # Histogram bins over the longest side of the images
+    SIZE_BINS = (0, 128, 256, 512, 1024, 2048, 4096)
+
+    def __init__(self, headers, unreadable=0):
+
+        '''
+        Size statistics of a set of images.
+
+        Parameters:
+        -----------
+            - headers (list): List of ImageHeader
+            - unreadable (int): Number of images whose size could not be read
+
+        Returns:
+        --------
+        None
+        '''
+
+        heights = np.array([header.height for header in headers], dtype=np.float64)
+        widths = np.array([header.width for header in headers], dtype=np.float64)
+
+        self.count = len(headers)
+        self.unreadable = unreadable
+        self.formats = Counter(header.format for header in headers)
+        self.channels = Counter(header.channels for header in headers)
+
+        if self.count:
+            self.mean_height, self.mean_width = heights.mean(), widths.mean()
+            self.median_height, self.median_width = np.median(heights), np.median(widths)
+            self.percentiles = {percentile: (np.percentile(heights, percentile), np.percentile(widths, percentile))
+                                for percentile in self.PERCENTILES}
+        else:
+            self.mean_height = self.mean_width = self.median_height = self.median_width = float('nan')
+            self.percentiles = {percentile: (float('nan'), float('nan')) for percentile in self.PERCENTILES}
+
+        counts, _ = np.histogram(np.maximum(heights, widths), bins=list(self.SIZE_BINS) + [np.inf])
+        labels = ['{}-{}'.format(low, high - 1) for low, high in zip(self.SIZE_BINS[:-1], self.SIZE_BINS[1:])]
+        labels.append('>={}'.format(self.SIZE_BINS[-1]))
+        self.histogram = dict(zip(labels, counts.tolist()))
+
+    def as_dict(self):
+
+        '''
+        Stats as a plain dict, e.g. to dump as JSON.
+
+        Returns:
+        --------
+        Stats (dict): All the stats
+        '''
+
+        return {'count': self.count,
+                'unreadable': self.unreadable,
+                'mean_height': float(self.mean_height),
+                'mean_width': float(self.mean_width),
+                'median_height': float(self.median_height),
+                'median_width': float(self.median_width),
+                'percentiles': {percentile: (float(height), float(width)) for percentile, (height, width) in self.percentiles.items()},
+                'histogram': dict(self.histogram),
+                'formats': dict(self.formats),
+                'channels': dict(self.channels)}
+
+    def __str__(self):
+
+        lines = ["[OUTPUT] Total number of images: {} ({} unreadable)".format(self.count, self.unreadable),
+                 "[OUTPUT] Mean height: {} | Mean width: {}".format(self.mean_height, self.mean_width),
+                 "[OUTPUT] Median height: {} | Median width: {}".format(self.median_height, self.median_width)]
+        lines.extend("[OUTPUT] P{} height: {} | P{} width: {}".format(percentile, height, percentile, width)
+                     for percentile, (height, width) in self.percentiles.items())
+        lines.append("[OUTPUT] Longest side histogram: {}".format(self.histogram))
+        lines.append("[OUTPUT] Formats: {} | Channels: {}".format(dict(self.formats), dict(self.channels)))
+
+        return "\n".join(lines)
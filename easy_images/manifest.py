@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import time
+
+
+class Manifest:
+
+    FILE_NAME = '.easy_images_manifest.jsonl'
+
+    STATUS_DOWNLOADED = 'downloaded'
+    STATUS_DUPLICATE = 'duplicate'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, keyword_directory_path, resume=False, reset=False):
+
+        '''
+        Append-only record of the downloads of a keyword directory, one JSON line per url with
+        the source url, file name, content hash (sha256), byte size, status and failure reason.
+        It is a hidden file, so it is not listed as an image. Every line is flushed as soon as it
+        is written, and a line cut by a crash is ignored when the manifest is read again. A file
+        written again by a later run has a newer record, the latest record of a file wins.
+
+        Parameters:
+        -----------
+            - keyword_directory_path (str): Path of the keyword directory
+            - resume (boolean): Whether to read the existing records, for the known urls and the numbering
+            - reset (boolean): Whether to start a new manifest, e.g. once the images of the directory are gone.
+              Otherwise new records are appended, so the images kept on disk keep their records.
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.path = os.path.join(keyword_directory_path, self.FILE_NAME)
+        self.records = self.read_records(keyword_directory_path) if resume and not reset else []
+        cut_line = not reset and self._cut_line()
+        self.file = open(self.path, 'w' if reset else 'a')
+
+        # End the line cut by a crash, so the next record does not join it
+        if cut_line:
+            self.file.write("\n")
+            self.file.flush()
+
+    @classmethod
+    def read_records(cls, keyword_directory_path):
+
+        '''
+        Read the records of the manifest of a keyword directory, without opening it for writing
+        (e.g. in a read-only dataset directory).
+
+        Parameters:
+        -----------
+            - keyword_directory_path (str): Path of the keyword directory
+
+        Returns:
+        --------
+        Records (list): Records of the manifest, in the order they were written. Empty without a manifest.
+        '''
+
+        path = os.path.join(keyword_directory_path, cls.FILE_NAME)
+        records = []
+
+        if not os.path.exists(path):
+            return records
+
+        with open(path) as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+
+        return records
+
+    def _cut_line(self):
+
+        '''
+        Whether the existing manifest ends with a line which is not newline terminated.
+
+        Returns:
+        --------
+        Cut (boolean): Whether the last line was cut
+        '''
+
+        if not os.path.exists(self.path):
+            return False
+
+        with open(self.path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() == 0:
+                return False
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) != b"\n"
+
+    def known_urls(self):
+
+        '''
+        Urls which were already fetched or are known to be bad, and must not be fetched again.
+
+        Returns:
+        --------
+        Urls (set): Urls of all the records
+        '''
+
+        return {record['url'] for record in self.records}
+
+    def last_number(self):
+
+        '''
+        Highest image number used by the downloaded images, so a resumed run continues the numbering.
+
+        Returns:
+        --------
+        Number (int): Highest image number, 0 if nothing was downloaded
+        '''
+
+        numbers = [int(match.group(1)) for match in (re.search(r'_(\d+)\.[^.]+$', record['file'] or '')
+                   for record in self.records if record['status'] == self.STATUS_DOWNLOADED) if match]
+
+        return max(numbers, default=0)
+
+    def last_file_number(self):
+
+        '''
+        Highest image number of the files in the keyword directory, recorded in the manifest or not.
+
+        Returns:
+        --------
+        Number (int): Highest image number, 0 if there is no numbered file
+        '''
+
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            return 0
+
+        numbers = [int(match.group(1)) for match in (re.search(r'_(\d+)\.[^.]+$', file_name)
+                   for file_name in os.listdir(directory) if not file_name.startswith('.')) if match]
+
+        return max(numbers, default=0)
+
+    def add(self, image_url, status, file_name=None, content_hash=None, number_of_bytes=None, reason=None):
+
+        '''
+        Append a record and flush it to disk.
+
+        Parameters:
+        -----------
+            - image_url (str): Source url of the image
+            - status (str): One of STATUS_DOWNLOADED, STATUS_DUPLICATE or STATUS_FAILED
+            - file_name (str): Name of the image file, for downloaded images
+            - content_hash (str): sha256 of the downloaded bytes
+            - number_of_bytes (int): Size of the downloaded image
+            - reason (str): Failure category of failed urls, e.g. 'timeout' (see easy_images.stats.failure_reason)
+
+        Returns:
+        --------
+        None
+        '''
+
+        record = {'url': image_url, 'file': file_name, 'sha256': content_hash, 'bytes': number_of_bytes,
+                  'status': status, 'time': time.time()}
+        if reason is not None: record['reason'] = reason
+
+        self.records.append(record)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+
+        '''
+        Close the manifest file.
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.file.close()
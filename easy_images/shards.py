@@ -0,0 +1,429 @@
+import io
+import json
+import mmap
+import os
+import tarfile
+import time
+
+import cv2
+import numpy as np
+
+SHARD_INDEX_FILE = 'index.jsonl'
+ARRAY_FILE = 'images.npy'
+ARRAY_LABELS_FILE = 'labels.jsonl'
+
+
+def is_shard_dir(path):
+
+    '''
+    Whether a directory holds shards written by ShardWriter.
+
+    Parameters:
+    -----------
+        - path (str): Path of the directory
+
+    Returns:
+    --------
+    Shard directory (boolean): Whether the directory has a shard index
+    '''
+
+    return os.path.isfile(os.path.join(path, SHARD_INDEX_FILE))
+
+
+def _write_json_lines(path, records):
+
+    '''
+    Write a JSON lines file through a temporary file, so readers never see a partial file.
+
+    Parameters:
+    -----------
+        - path (str): Path of the file
+        - records (iterable): JSON serializable records
+
+    Returns:
+    --------
+    None
+    '''
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+    os.replace(temp_path, path)
+
+
+def _read_json_lines(path):
+
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class ShardWriter:
+
+    def __init__(self, shard_dir, max_shard_bytes=256 * 1024 * 1024, prefix='shard'):
+
+        '''
+        Pack images into tar shards in the WebDataset layout: every image is a member named
+        <key><format>, next to a <key>.json member with its label and metadata. An index
+        (index.jsonl) records the shard, byte offset and size of every image, so readers get
+        random access without scanning the tars.
+
+        Parameters:
+        -----------
+            - shard_dir (str): Directory of the shards, created if needed
+            - max_shard_bytes (int): A new shard is started once a shard reaches this size
+            - prefix (str): File name prefix of the shards
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.shard_dir = shard_dir
+        self.max_shard_bytes = max_shard_bytes
+        self.prefix = prefix
+        self.records = []
+        self.keys = set()
+
+        self.tar = None
+        self.shard_name = None
+        self.number_of_shards = 0
+
+        if not os.path.exists(shard_dir): os.makedirs(shard_dir)
+
+    def _add_member(self, name, data):
+
+        '''
+        Append a member to the current tar.
+
+        Parameters:
+        -----------
+            - name (str): Member name
+            - data (bytes-like): Member data
+
+        Returns:
+        --------
+        Offset (int): Byte offset of the member data inside the tar
+        '''
+
+        tar_info = tarfile.TarInfo(name)
+        tar_info.size = len(data)
+        tar_info.mtime = int(time.time())
+
+        # The data follows the header blocks of the member
+        offset = self.tar.offset + len(tar_info.tobuf(self.tar.format, self.tar.encoding, self.tar.errors))
+        self.tar.addfile(tar_info, io.BytesIO(data))
+
+        return offset
+
+    def add(self, key, data, file_format='.jpeg', label=None, metadata=None):
+
+        '''
+        Add an encoded image.
+
+        Parameters:
+        -----------
+            - key (str): Unique key of the image, without dots e.g. 'dog/dog_1'
+            - data (bytes-like): Encoded image
+            - file_format (str): File format of the image e.g. '.jpeg'
+            - label (str): Label of the image, e.g. its keyword
+            - metadata (dict): Extra JSON serializable metadata e.g. the source url
+
+        Returns:
+        --------
+        None
+        '''
+
+        if '.' in os.path.basename(key):
+            raise ValueError("Shard keys can not contain dots: '{}'".format(key))
+        if key in self.keys:
+            raise ValueError("Duplicate shard key: '{}'".format(key))
+
+        if self.tar is None or self.tar.offset >= self.max_shard_bytes:
+            self._next_shard()
+
+        record = dict(metadata or {})
+        record.update({'key': key, 'label': label, 'format': file_format})
+
+        offset = self._add_member(key + file_format, data)
+        self._add_member(key + '.json', json.dumps(record).encode('utf-8'))
+
+        record.update({'shard': self.shard_name, 'offset': offset, 'size': len(data)})
+        self.records.append(record)
+        self.keys.add(key)
+
+    def _next_shard(self):
+
+        if self.tar is not None: self.tar.close()
+
+        self.shard_name = '{}-{:05d}.tar'.format(self.prefix, self.number_of_shards)
+        self.tar = tarfile.open(os.path.join(self.shard_dir, self.shard_name), 'w', format=tarfile.PAX_FORMAT)
+        self.number_of_shards += 1
+
+    def close(self):
+
+        '''
+        Close the last shard and write the index.
+
+        Returns:
+        --------
+        None
+        '''
+
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+        _write_json_lines(os.path.join(self.shard_dir, SHARD_INDEX_FILE), self.records)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+
+class ShardReader:
+
+    def __init__(self, shard_dir):
+
+        '''
+        Random access to the images of a shard directory. The shards are memory mapped, so the
+        bytes of an image are a zero-copy memoryview of the page cache.
+
+        Parameters:
+        -----------
+            - shard_dir (str): Directory of the shards
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.shard_dir = shard_dir
+        self.records = _read_json_lines(os.path.join(shard_dir, SHARD_INDEX_FILE))
+        self.maps = {}
+
+    def __len__(self):
+
+        return len(self.records)
+
+    def _map(self, shard_name):
+
+        shard_map = self.maps.get(shard_name)
+
+        if shard_map is None:
+            with open(os.path.join(self.shard_dir, shard_name), 'rb') as file:
+                shard_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[shard_name] = shard_map
+
+        return shard_map
+
+    def __getitem__(self, index):
+
+        '''
+        Encoded bytes of an image.
+
+        Parameters:
+        -----------
+            - index (int): Index of the image
+
+        Returns:
+        --------
+        Data (memoryview): Zero-copy view of the encoded image
+        '''
+
+        record = self.records[index]
+        return memoryview(self._map(record['shard']))[record['offset']:record['offset'] + record['size']]
+
+    def __iter__(self):
+
+        for index in range(len(self.records)):
+            yield self.records[index], self[index]
+
+    @property
+    def labels(self):
+
+        return [record['label'] for record in self.records]
+
+    def read_image(self, index, flags=cv2.IMREAD_COLOR):
+
+        '''
+        Decode an image straight from the memory mapped shard.
+
+        Parameters:
+        -----------
+            - index (int): Index of the image
+            - flags (int): OpenCV imread flags
+
+        Returns:
+        --------
+        Image (numpy array / None): Decoded image, None if it can not be decoded
+        '''
+
+        return cv2.imdecode(np.frombuffer(self[index], dtype=np.uint8), flags)
+
+    def close(self):
+
+        '''
+        Unmap the shards. A shard with views of the reader still alive can not be unmapped yet,
+        it is unmapped once the views and the map are garbage collected.
+
+        Returns:
+        --------
+        None
+        '''
+
+        for shard_map in self.maps.values():
+            try:
+                shard_map.close()
+            except BufferError:
+                pass
+        self.maps = {}
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+
+class ImageArrayWriter:
+
+    def __init__(self, output_dir, capacity, size=(200, 200), channels=3):
+
+        '''
+        Store same-sized images as one memory mapped NumPy array (images.npy) of shape
+        (count, height, width, channels), or (count, height, width) for grayscale, next to a
+        label table (labels.jsonl) with one record per row.
+
+        Parameters:
+        -----------
+            - output_dir (str): Directory of the array, created if needed
+            - capacity (int): Maximum number of images, the array is shrunk to the images added on close
+            - size (tuple): (width, height) of the images, as for cv2.resize
+            - channels (int): Number of channels, 1 for grayscale
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.output_dir = output_dir
+        self.array_path = os.path.join(output_dir, ARRAY_FILE)
+        self.records = []
+
+        width, height = size
+        self.image_shape = (height, width) if channels == 1 else (height, width, channels)
+
+        if not os.path.exists(output_dir): os.makedirs(output_dir)
+
+        self.images = np.lib.format.open_memmap(self.array_path, mode='w+', dtype=np.uint8,
+                                                shape=(max(1, capacity),) + self.image_shape)
+
+    def add(self, image, key=None, label=None, metadata=None):
+
+        '''
+        Add a decoded image as the next row.
+
+        Parameters:
+        -----------
+            - image (numpy array): Image of the array shape
+            - key (str): Key of the image, e.g. its source path
+            - label (str): Label of the image, e.g. its keyword
+            - metadata (dict): Extra JSON serializable metadata
+
+        Returns:
+        --------
+        Row (int): Row of the image in the array
+        '''
+
+        row = len(self.records)
+        self.images[row] = image.reshape(self.image_shape)
+
+        record = dict(metadata or {})
+        record.update({'row': row, 'key': key, 'label': label})
+        self.records.append(record)
+
+        return row
+
+    def close(self):
+
+        '''
+        Flush the array, shrink it to the images added and write the label table.
+
+        Returns:
+        --------
+        None
+        '''
+
+        count = len(self.records)
+        self.images.flush()
+        capacity = self.images.shape[0]
+        del self.images
+
+        if count < capacity: self._shrink(count)
+
+        _write_json_lines(os.path.join(self.output_dir, ARRAY_LABELS_FILE), self.records)
+
+    def _shrink(self, count):
+
+        '''
+        Shrink the array file to its first count rows, rewriting the header in place when its
+        length allows (NumPy pads headers for that), otherwise by copying the rows.
+
+        Parameters:
+        -----------
+            - count (int): Number of rows to keep
+
+        Returns:
+        --------
+        None
+        '''
+
+        shape = (count,) + self.image_shape
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint8)),
+                                                      'fortran_order': False, 'shape': shape})
+
+        with open(self.array_path, 'r+b') as file:
+            np.lib.format.read_magic(file)
+            np.lib.format.read_array_header_1_0(file)
+            data_offset = file.tell()
+
+            if len(header.getvalue()) == data_offset:
+                file.seek(0)
+                file.write(header.getvalue())
+                file.truncate(data_offset + count * int(np.prod(self.image_shape)))
+                return
+
+        rows = np.load(self.array_path, mmap_mode='r')[:count]
+        temp_path = self.array_path + '.tmp.npy'
+        np.save(temp_path, rows)
+        del rows
+        os.replace(temp_path, self.array_path)
+
+
+def load_image_array(output_dir):
+
+    '''
+    Open an image array written by ImageArrayWriter without reading it: rows are paged in
+    from disk on access.
+
+    Parameters:
+    -----------
+        - output_dir (str): Directory of the array
+
+    Returns:
+    --------
+    (images, records) (tuple): Read-only memory mapped array and the label records of its rows
+    '''
+
+    images = np.load(os.path.join(output_dir, ARRAY_FILE), mmap_mode='r')
+    records = _read_json_lines(os.path.join(output_dir, ARRAY_LABELS_FILE))
+
+    return images, records
@@ -0,0 +1,106 @@
+import cv2
+
+
+class Stage:
+
+    '''
+    Base class of the in-memory transforms run by EasyImages.post_processing. Every image is
+    decoded once, passed through all the stages in order and written back at most once.
+
+    A stage gets the decoded image (numpy array) and its path, and returns the transformed
+    image, or None to drop the image (it is removed from the directory). Stages which only
+    inspect an image return the same array, and images no stage changed are not re-encoded.
+
+    Stages run inside the worker processes when workers > 1, so custom stages must be
+    defined at module level (picklable).
+    '''
+
+    name = 'stage'
+
+    def __call__(self, image, image_path):
+
+        return image
+
+
+class Resize(Stage):
+
+    name = 'resize'
+    MODES = ('stretch', 'fit', 'crop')
+
+    def __init__(self, size=(200, 200), mode='stretch'):
+
+        '''
+        Resize images to a fixed size. 'stretch' resizes to exactly size, ignoring the aspect
+        ratio. 'fit' keeps the aspect ratio and scales the image to fit inside size. 'crop' keeps
+        the aspect ratio, scales the image to cover size and crops the center to exactly size.
+
+        Parameters:
+        -----------
+            - size (tuple): Image size to resize, (width, height)
+            - mode (str): One of 'stretch', 'fit' or 'crop'
+
+        Returns:
+        --------
+        None
+        '''
+
+        if mode not in self.MODES:
+            raise ValueError("Unknown resize mode '{}', expected one of {}".format(mode, ', '.join(self.MODES)))
+
+        self.size = tuple(size)
+        self.mode = mode
+
+    def scaled_size(self, width, height):
+
+        '''
+        Size an image of the given size is scaled to, before cropping.
+
+        Parameters:
+        -----------
+            - width (int): Width of the image
+            - height (int): Height of the image
+
+        Returns:
+        --------
+        Size (tuple): (width, height) of the scaled image
+        '''
+
+        target_width, target_height = self.size
+        if self.mode == 'stretch':
+            return self.size
+
+        if self.mode == 'fit':
+            scale = min(target_width / width, target_height / height)
+            return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+        scale = max(target_width / width, target_height / height)
+        return max(target_width, int(round(width * scale))), max(target_height, int(round(height * scale)))
+
+    def __call__(self, image, image_path):
+
+        if self.mode == 'stretch':
+            return cv2.resize(image, self.size)
+
+        height, width = image.shape[:2]
+        scaled_width, scaled_height = self.scaled_size(width, height)
+        # Area interpolation does not alias when shrinking
+        interpolation = cv2.INTER_AREA if scaled_width < width else cv2.INTER_LINEAR
+        image = cv2.resize(image, (scaled_width, scaled_height), interpolation=interpolation)
+
+        if self.mode == 'crop':
+            target_width, target_height = self.size
+            left, top = (scaled_width - target_width) // 2, (scaled_height - target_height) // 2
+            image = image[top:top + target_height, left:left + target_width].copy()
+
+        return image
+
+
+class Grayscale(Stage):
+
+    name = 'grayscale'
+
+    def __call__(self, image, image_path):
+
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
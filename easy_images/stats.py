@@ -0,0 +1,279 @@
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+class FetchError(ValueError):
+
+    def __init__(self, message, reason):
+
+        '''
+        An image url which did not give an acceptable image, with the category of the failure.
+
+        Parameters:
+        -----------
+            - message (str): Error message
+            - reason (str): Failure category, e.g. 'not_image' or 'too_large'
+
+        Returns:
+        --------
+        None
+        '''
+
+        super().__init__(message)
+        self.reason = reason
+
+
+def failure_reason(error):
+
+    '''
+    Category of a download failure, for the failure counts of RunStats.
+
+    Parameters:
+    -----------
+        - error (Exception): Error raised while fetching or writing an image
+
+    Returns:
+    --------
+    Reason (str): One of the FetchError reasons, 'timeout', 'connection', 'http_error', 'io_error' or 'other'
+    '''
+
+    if isinstance(error, FetchError):
+        return error.reason
+
+    # Errors of requests only exist once it is loaded. Post processing also gets here, for the files it
+    # can not remove, and must not load it.
+    requests = sys.modules.get('requests')
+
+    # Timeouts first, connect timeouts are connection errors too. They are OSErrors as well, so before io_error.
+    if requests is not None:
+        if isinstance(error, requests.exceptions.Timeout):
+            return 'timeout'
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return 'connection'
+        if isinstance(error, (requests.exceptions.HTTPError, requests.exceptions.RetryError)):
+            return 'http_error'
+    if isinstance(error, OSError):
+        return 'io_error'
+
+    return 'other'
+
+
+class RunStats:
+
+    def __init__(self, name, hooks=None, logger=None):
+
+        '''
+        Structured stats of a download() or post processing run: counts (found, downloaded,
+        duplicates ...), byte counts, failure counts by reason and the seconds spent in every
+        stage (harvest, fetch, sniff, decode, hash, write ...), in total and per keyword. Stage
+        seconds are summed over the worker threads and processes, so stages running concurrently
+        can add up to more than the wall time. Updates are thread safe.
+
+        Hooks are callables hook(event, data), e.g. to export metrics to a monitoring system:
+            - 'stage': {'stage', 'seconds', 'keyword'} for every timed stage
+            - 'failure': {'reason', 'keyword', 'error'} for every failure
+            - 'keyword': stats of a finished keyword (see as_dict)
+            - 'run': stats of the finished run (see as_dict)
+        Events come from the worker threads, but hooks are called one event at a time, so they
+        need not be thread safe. A failing hook is logged and does not stop the run.
+
+        Parameters:
+        -----------
+            - name (str): Name of the run, e.g. 'download'
+            - hooks (list): Callables called with (event, data)
+            - logger (Logger): Logger of hook errors
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.name = name
+        self.hooks = list(hooks or [])
+        self.logger = logger
+
+        self.counts = Counter()
+        self.bytes = Counter()
+        self.failures = Counter()
+        self.timings = defaultdict(float)
+        self.extra = {}
+        self.keywords = {}
+
+        self.started = time.time()
+        self.seconds = None
+        self._lock = threading.Lock()
+        # Hooks run outside of the stats lock, so they can read the stats, but one at a time
+        self._hook_lock = threading.RLock()
+
+    def keyword(self, keyword):
+
+        '''
+        Stats of a keyword, created on first use.
+
+        Parameters:
+        -----------
+            - keyword (str): Keyword
+
+        Returns:
+        --------
+        Stats (RunStats): Stats of the keyword, without hooks
+        '''
+
+        with self._lock:
+            keyword_stats = self.keywords.get(keyword)
+            if keyword_stats is None:
+                keyword_stats = self.keywords[keyword] = RunStats(keyword)
+
+        return keyword_stats
+
+    def _targets(self, keyword):
+
+        return (self,) if keyword is None else (self, self.keyword(keyword))
+
+    def count(self, name, value=1, keyword=None):
+
+        for stats in self._targets(keyword):
+            with stats._lock:
+                stats.counts[name] += value
+
+    def add_bytes(self, name, value, keyword=None):
+
+        for stats in self._targets(keyword):
+            with stats._lock:
+                stats.bytes[name] += value
+
+    def add_times(self, timings, keyword=None):
+
+        '''
+        Add the seconds spent in stages.
+
+        Parameters:
+        -----------
+            - timings (dict): Stage name -> seconds
+            - keyword (str): Keyword the time was spent on, None for the run only
+
+        Returns:
+        --------
+        None
+        '''
+
+        for stats in self._targets(keyword):
+            with stats._lock:
+                for stage, seconds in timings.items():
+                    stats.timings[stage] += seconds
+
+        if self.hooks:
+            for stage, seconds in timings.items():
+                self._emit('stage', {'stage': stage, 'seconds': seconds, 'keyword': keyword})
+
+    @contextmanager
+    def timer(self, stage, keyword=None):
+
+        '''
+        Time the block as a stage.
+
+        Parameters:
+        -----------
+            - stage (str): Stage name
+            - keyword (str): Keyword the time is spent on
+
+        Returns:
+        --------
+        None
+        '''
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_times({stage: time.perf_counter() - start_time}, keyword)
+
+    def add_failure(self, reason, keyword=None, error=None):
+
+        for stats in self._targets(keyword):
+            with stats._lock:
+                stats.failures[reason] += 1
+
+        if self.hooks:
+            self._emit('failure', {'reason': reason, 'keyword': keyword, 'error': None if error is None else str(error)})
+
+    def finish_keyword(self, keyword):
+
+        if self.hooks:
+            self._emit('keyword', self.keyword(keyword).as_dict())
+
+    def finish(self):
+
+        '''
+        Record the wall time of the run and call the 'run' hooks.
+
+        Returns:
+        --------
+        self (RunStats): The stats themselves
+        '''
+
+        self.seconds = time.time() - self.started
+        if self.hooks:
+            self._emit('run', self.as_dict())
+
+        return self
+
+    def _emit(self, event, data):
+
+        with self._hook_lock:
+            for hook in self.hooks:
+                try:
+                    hook(event, data)
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.error("[ERROR] Stats hook failed: %s", e)
+
+    def __getitem__(self, name):
+
+        # Summary dict style access, e.g. stats['Written'] or stats['Image size']
+        if name in self.extra:
+            return self.extra[name]
+        return self.counts[name]
+
+    def as_dict(self):
+
+        '''
+        Stats as a plain dict, e.g. to dump as JSON.
+
+        Returns:
+        --------
+        Stats (dict): All the stats, with the stats of every keyword under 'keywords'
+        '''
+
+        with self._lock:
+            stats = {'name': self.name,
+                     'seconds': self.seconds,
+                     'counts': dict(self.counts),
+                     'bytes': dict(self.bytes),
+                     'failures': dict(self.failures),
+                     'timings': dict(self.timings),
+                     'extra': {name: value.as_dict() if hasattr(value, 'as_dict') else value for name, value in self.extra.items()}}
+            keywords = list(self.keywords.items())
+
+        stats['keywords'] = {keyword: keyword_stats.as_dict() for keyword, keyword_stats in keywords}
+
+        return stats
+
+    def __str__(self):
+
+        lines = ["[OUTPUT] {}: {}".format(self.name, " | ".join("{} {}".format(name, value) for name, value in self.counts.items()))]
+        if self.seconds is not None:
+            lines.append("[OUTPUT] Wall time: {:.2f}s".format(self.seconds))
+        if self.timings:
+            lines.append("[OUTPUT] Stage seconds: {}".format(" | ".join("{} {:.2f}".format(stage, seconds)
+                                                                      for stage, seconds in self.timings.items())))
+        if self.bytes:
+            lines.append("[OUTPUT] Bytes: {}".format(" | ".join("{} {}".format(name, value) for name, value in self.bytes.items())))
+        if self.failures:
+            lines.append("[OUTPUT] Failures: {}".format(" | ".join("{} {}".format(reason, value)
+                                                                 for reason, value in self.failures.items())))
+
+        return "\n".join(lines)
@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class UrlCache:
+
+    def __init__(self, db_path, ttl=24 * 3600, max_entries=1000):
+
+        '''
+        Persistent on-disk cache of the image urls harvested for a keyword, stored in SQLite. An
+        entry is keyed by the keyword and its depth (number of urls harvested), expires after
+        ttl seconds, and the least recently used entries are evicted beyond max_entries.
+
+        The cache is shared by the keyword workers, so the connection is guarded by a lock.
+
+        Parameters:
+        -----------
+            - db_path (str): Path of the SQLite database file
+            - ttl (float): Seconds after which an entry expires
+            - max_entries (int): Maximum number of entries
+
+        Returns:
+        --------
+        None
+        '''
+
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(db_dir): os.makedirs(db_dir)
+
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS url_lists (
+                                       keyword TEXT NOT NULL,
+                                       depth INTEGER NOT NULL,
+                                       created REAL NOT NULL,
+                                       accessed REAL NOT NULL,
+                                       urls TEXT NOT NULL,
+                                       PRIMARY KEY (keyword, depth))''')
+        self.connection.commit()
+
+    def get(self, keyword):
+
+        '''
+        Get the deepest url list of the keyword which has not expired.
+
+        Parameters:
+        -----------
+            - keyword (str): Keyword of the urls
+
+        Returns:
+        --------
+        image_url_list (list / None): Cached image urls, None on a cache miss
+        '''
+
+        now = time.time()
+
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM url_lists WHERE created < ?', (now - self.ttl,))
+            row = self.connection.execute('SELECT depth, urls FROM url_lists WHERE keyword = ? ORDER BY depth DESC LIMIT 1',
+                                          (keyword,)).fetchone()
+            if row is None:
+                return None
+
+            self.connection.execute('UPDATE url_lists SET accessed = ? WHERE keyword = ? AND depth = ?', (now, keyword, row[0]))
+
+        return json.loads(row[1])
+
+    def put(self, keyword, image_url_list):
+
+        '''
+        Store the url list of a keyword. Shallower lists of the keyword are superseded by it.
+
+        Parameters:
+        -----------
+            - keyword (str): Keyword of the urls
+            - image_url_list (list): Image urls, in the order of the result page
+
+        Returns:
+        --------
+        None
+        '''
+
+        now = time.time()
+        depth = len(image_url_list)
+
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM url_lists WHERE keyword = ? AND depth <= ?', (keyword, depth))
+            self.connection.execute('INSERT INTO url_lists VALUES (?, ?, ?, ?, ?)',
+                                    (keyword, depth, now, now, json.dumps(image_url_list)))
+            self.connection.execute('''DELETE FROM url_lists WHERE rowid NOT IN (
+                                           SELECT rowid FROM url_lists ORDER BY accessed DESC LIMIT ?)''', (self.max_entries,))
+
+    def close(self):
+
+        '''
+        Close the database connection.
+
+        Returns:
+        --------
+        None
+        '''
+
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,413 @@
+import mmap
+import os
+import time
+
+import cv2
+import numpy as np
+
+from easy_images import hashing
+from easy_images.image_info import ImageHeader, read_image_header
+
+# JPEG decode scales, libjpeg decodes straight to 1/2, 1/4 or 1/8 of the size for a fraction of the cost
+REDUCED_DECODE_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+
+
+def init_worker():
+
+    '''
+    Initialize a post processing worker process. OpenCV runs single threaded inside the worker,
+    the parallelism comes from the process pool.
+
+    Returns:
+    --------
+    None
+    '''
+
+    cv2.setNumThreads(1)
+
+
+def hash_images(image_paths, hash_type='dhash', hash_size=8):
+
+    '''
+    Decode and hash a chunk of images.
+
+    Parameters:
+    -----------
+        - image_paths (list): Paths of the images
+        - hash_type (str): Perceptual hash, one of 'dhash', 'ahash' or 'phash'
+        - hash_size (int): Size of hash
+
+    Returns:
+    --------
+    Results (list): (image_path, hash, error) for every image. Hash is None if the image can not be decoded.
+    '''
+
+    results = []
+    decoded_paths = []
+    images = []
+
+    for image_path in image_paths:
+        image = cv2.imread(image_path)
+        if image is None:
+            results.append((image_path, None, "Can not decode {}".format(image_path)))
+        else:
+            decoded_paths.append(image_path)
+            images.append(image)
+
+    results.extend((image_path, image_hash, None) for image_path, image_hash
+                   in zip(decoded_paths, hashing.image_hashes(images, hash_type, hash_size)))
+
+    return results
+
+
+def _apply_stages(image, image_path, stages, hash_type, hash_size, info):
+
+    '''
+    Hash a decoded image and run it through the stages, recording the outcome and the seconds
+    spent hashing and transforming in info.
+
+    Parameters:
+    -----------
+        - image (numpy array): Decoded image
+        - image_path (str): Path (or shard key) of the image, passed to the stages
+        - stages (list): List of easy_images.stages.Stage objects, applied in order
+        - hash_type (str): Perceptual hash of the decoded image. None to skip hashing.
+        - hash_size (int): Size of hash
+        - info (dict): Result info of the image, updated in place
+
+    Returns:
+    --------
+    Image (numpy array / None): Transformed image, the same array if no stage changed it, None if a stage dropped it
+    '''
+
+    start_time = time.perf_counter()
+    if hash_type is not None:
+        info['hash'] = hashing.image_hash(image, hash_type, hash_size)
+        info['timings']['hash'] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for stage in stages:
+        image = stage(image, image_path)
+        if image is None:
+            info['dropped_by'] = stage.name
+            break
+    if stages: info['timings']['transform'] = time.perf_counter() - start_time
+
+    return image
+
+
+def process_images(image_paths, stages=(), hash_type=None, hash_size=8):
+
+    '''
+    Fused post processing of a chunk of images: decode every image once, hash it, run it
+    through the stages in memory and write it back at most once.
+
+    Parameters:
+    -----------
+        - image_paths (list): Paths of the images
+        - stages (list): List of easy_images.stages.Stage objects, applied in order
+        - hash_type (str): Perceptual hash of the decoded image, one of 'dhash', 'ahash' or 'phash'. None to skip hashing.
+        - hash_size (int): Size of hash
+
+    Returns:
+    --------
+    Results (list): (image_path, info, error) for every image. Info holds the hash, the final header
+    (size, channels and format) of the image, whether it was written, the name of the stage which dropped it (if any),
+    whether it could not be decoded and the seconds spent per stage (decode, hash, transform, write).
+    '''
+
+    results = []
+
+    for image_path in image_paths:
+        try:
+            info = {'hash': None, 'header': None, 'written': False, 'dropped_by': None, 'unreadable': False, 'timings': {}}
+
+            start_time = time.perf_counter()
+            original = cv2.imread(image_path)
+            info['timings']['decode'] = time.perf_counter() - start_time
+            if original is None:
+                info['unreadable'] = True
+                results.append((image_path, info, None))
+                continue
+
+            image = _apply_stages(original, image_path, stages, hash_type, hash_size, info)
+
+            if image is not None:
+                if image is not original:
+                    start_time = time.perf_counter()
+                    if not cv2.imwrite(image_path, image): raise ValueError("Can not write {}".format(image_path))
+                    info['timings']['write'] = time.perf_counter() - start_time
+                    info['written'] = True
+                info['header'] = _decoded_header(image_path, image)
+
+            results.append((image_path, info, None))
+
+        except Exception as e:
+            results.append((image_path, None, str(e)))
+
+    return results
+
+
+def process_shard_records(records, shard_dir, stages=(), hash_type=None, hash_size=8):
+
+    '''
+    Fused post processing of a chunk of shard records: every image is decoded straight from
+    the memory mapped shard, hashed and run through the stages. Changed images are encoded
+    again and returned, as the shards are rewritten by the main process.
+
+    Parameters:
+    -----------
+        - records (list): Index records of the images (see easy_images.shards.ShardWriter)
+        - shard_dir (str): Directory of the shards
+        - stages (list): List of easy_images.stages.Stage objects, applied in order
+        - hash_type (str): Perceptual hash of the decoded image, one of 'dhash', 'ahash' or 'phash'. None to skip hashing.
+        - hash_size (int): Size of hash
+
+    Returns:
+    --------
+    Results (list): (key, info, error) for every image. Info holds the same fields as for process_images, plus
+    the encoded image under 'data' if it was changed.
+    '''
+
+    results = []
+    shard_maps = {}
+
+    try:
+        for record in records:
+            key = record['key']
+            try:
+                info = {'hash': None, 'header': None, 'written': False, 'dropped_by': None, 'unreadable': False, 'data': None,
+                        'timings': {}}
+
+                shard_map = shard_maps.get(record['shard'])
+                if shard_map is None:
+                    with open(os.path.join(shard_dir, record['shard']), 'rb') as file:
+                        shard_map = shard_maps[record['shard']] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+                start_time = time.perf_counter()
+                original = _decode_record(shard_map, record)
+                info['timings']['decode'] = time.perf_counter() - start_time
+
+                if original is None:
+                    info['unreadable'] = True
+                    results.append((key, info, None))
+                    continue
+
+                image = _apply_stages(original, key, stages, hash_type, hash_size, info)
+
+                if image is not None:
+                    if image is not original:
+                        start_time = time.perf_counter()
+                        encoded, data = cv2.imencode(record['format'], image)
+                        info['timings']['encode'] = time.perf_counter() - start_time
+                        if not encoded: raise ValueError("Can not encode {}".format(key))
+                        info['data'] = data.tobytes()
+                        info['written'] = True
+                    info['header'] = _decoded_header(key + record['format'], image)
+
+                results.append((key, info, None))
+
+            except Exception as e:
+                results.append((key, None, str(e)))
+
+    finally:
+        for shard_map in shard_maps.values():
+            shard_map.close()
+
+    return results
+
+
+def _decode_record(shard_map, record):
+
+    '''
+    Decode an image from a memory mapped shard. The view on the map is only alive inside this
+    function, so the map can be closed afterwards.
+
+    Parameters:
+    -----------
+        - shard_map (mmap): Memory mapped shard
+        - record (dict): Index record of the image
+
+    Returns:
+    --------
+    Image (numpy array / None): Decoded image, None if it can not be decoded
+    '''
+
+    return cv2.imdecode(np.frombuffer(shard_map, dtype=np.uint8, count=record['size'], offset=record['offset']), cv2.IMREAD_COLOR)
+
+
+def transform_images(image_paths, stages=()):
+
+    '''
+    Decode a chunk of images and run them through the stages, returning the images instead
+    of writing them, e.g. to fill an image array.
+
+    Parameters:
+    -----------
+        - image_paths (list): Paths of the images
+        - stages (list): List of easy_images.stages.Stage objects, applied in order
+
+    Returns:
+    --------
+    Results (list): (image_path, image, error) for every image. Image is None if a stage dropped it.
+    '''
+
+    results = []
+
+    for image_path in image_paths:
+        try:
+            image = cv2.imread(image_path)
+            if image is None:
+                results.append((image_path, None, "Can not decode {}".format(image_path)))
+                continue
+
+            for stage in stages:
+                image = stage(image, image_path)
+                if image is None: break
+
+            results.append((image_path, image, None))
+
+        except Exception as e:
+            results.append((image_path, None, str(e)))
+
+    return results
+
+
+def decode_scale(header, resizes):
+
+    '''
+    Largest JPEG decode scale at which the image still covers every resize target, so that no
+    target is upscaled from the reduced image. Both orientations of the header are checked, as
+    the EXIF orientation is applied after decoding.
+
+    Parameters:
+    -----------
+        - header (ImageHeader / None): Header of the image
+        - resizes (list): easy_images.stages.Resize stages
+
+    Returns:
+    --------
+    Scale (int): 8, 4 or 2 to decode at 1/8, 1/4 or 1/2 of the size, 1 to decode at full size (also for other formats)
+    '''
+
+    if header is None or header.format != 'jpeg':
+        return 1
+
+    def covers(width, height, scale, resize):
+        scaled_width, scaled_height = resize.scaled_size(width, height)
+        return -(-width // scale) >= scaled_width and -(-height // scale) >= scaled_height
+
+    for scale in sorted(REDUCED_DECODE_FLAGS, reverse=True):
+        if all(covers(header.width, header.height, scale, resize) and covers(header.height, header.width, scale, resize)
+               for resize in resizes):
+            return scale
+
+    return 1
+
+
+def resize_images(image_paths, targets, reduced_decoding=True):
+
+    '''
+    Multi-size resizing of a chunk of images: every image is decoded once, JPEGs at the smallest
+    scale which still covers the largest target (see decode_scale), and a resized copy is
+    written for every target.
+
+    Parameters:
+    -----------
+        - image_paths (list): Paths of the images
+        - targets (list): (Resize stage, output directory) pairs. An output directory of None overwrites the image.
+        - reduced_decoding (boolean): Whether to decode JPEGs at a reduced scale
+
+    Returns:
+    --------
+    Results (list): (image_path, info, error) for every image. Info holds the same fields as for process_images (the header
+    is the one of the last target), plus the decode scale ('scale') and the number of files written ('outputs').
+    '''
+
+    resizes = [resize for resize, _ in targets]
+    results = []
+
+    for image_path in image_paths:
+        try:
+            info = {'hash': None, 'header': None, 'written': False, 'dropped_by': None, 'unreadable': False,
+                    'timings': {'transform': 0.0, 'write': 0.0}, 'scale': 1, 'outputs': 0}
+
+            start_time = time.perf_counter()
+            scale = decode_scale(read_image_header(image_path), resizes) if reduced_decoding else 1
+            image = cv2.imread(image_path, REDUCED_DECODE_FLAGS[scale] if scale > 1 else cv2.IMREAD_COLOR)
+            info['timings']['decode'] = time.perf_counter() - start_time
+
+            if image is None:
+                info['unreadable'] = True
+                results.append((image_path, info, None))
+                continue
+
+            info['scale'] = scale
+
+            for resize, output_dir in targets:
+                start_time = time.perf_counter()
+                resized = resize(image, image_path)
+                info['timings']['transform'] += time.perf_counter() - start_time
+
+                output_path = image_path if output_dir is None else os.path.join(output_dir, os.path.basename(image_path))
+                start_time = time.perf_counter()
+                if not cv2.imwrite(output_path, resized): raise ValueError("Can not write {}".format(output_path))
+                info['timings']['write'] += time.perf_counter() - start_time
+
+                info['outputs'] += 1
+                info['header'] = _decoded_header(output_path, resized)
+
+            info['written'] = True
+            results.append((image_path, info, None))
+
+        except Exception as e:
+            results.append((image_path, None, str(e)))
+
+    return results
+
+
+def _decoded_header(image_path, image):
+
+    '''
+    Header of a decoded image, the format is taken from the file extension.
+
+    Parameters:
+    -----------
+        - image_path (str): Path of the image
+        - image (numpy array): Decoded image
+
+    Returns:
+    --------
+    Header (ImageHeader): Header of the image
+    '''
+
+    file_format = os.path.splitext(image_path)[1].lstrip('.').lower().replace('jpg', 'jpeg')
+    channels = 1 if image.ndim == 2 else image.shape[2]
+
+    return ImageHeader(image.shape[1], image.shape[0], channels, file_format)
+
+
+def decode_image_headers(image_paths):
+
+    '''
+    Decode a chunk of images to get their size, for formats whose header can not be read directly.
+
+    Parameters:
+    -----------
+        - image_paths (list): Paths of the images
+
+    Returns:
+    --------
+    Results (list): (image_path, header, error) for every image
+    '''
+
+    results = []
+
+    for image_path in image_paths:
+        image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            results.append((image_path, None, "Can not decode {}".format(image_path)))
+        else:
+            results.append((image_path, _decoded_header(image_path, image), None))
+
+    return results
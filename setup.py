@@ -11,14 +11,14 @@ setup_args = dict(
     long_description=README,
 	long_description_content_type='text/markdown',
     license='MIT',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     author='Mohd Saqib',
     author_email='mohdsaqibhbi@gmail.com',
     keywords=['easy images', 'easy images downloader', 'python image download', 'google images', 'image downloader'],
     url='https://github.com/mohdsaqibhbi/easy_images.git',
     download_url='https://pypi.org/project/easy_images_downloader/'
 )
-install_requires = ["requests", "opencv-python", "beautifulsoup4", "selenium",
+install_requires = ["requests", "opencv-python", "selenium",
                         "tqdm", "webdriver-manager", "tabulate", "python-magic;platform_system=='Linux'",
                         "python-magic-bin;platform_system=='Windows'"]
 
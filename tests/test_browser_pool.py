@@ -0,0 +1,175 @@
+import os
+import threading
+
+import pytest
+
+from benchmarks.fixtures import FakeDriver, ImageServer, make_result_page
+from easy_images.browser_pool import BrowserPool
+from easy_images.easy_images import EasyImages
+
+
+class Driver:
+
+    def __init__(self, number):
+
+        self.number = number
+        self.quit_calls = 0
+
+    def quit(self):
+
+        self.quit_calls += 1
+
+
+class DriverFactory:
+
+    def __init__(self):
+
+        self.drivers = []
+
+    def __call__(self):
+
+        self.drivers.append(Driver(len(self.drivers)))
+        return self.drivers[-1]
+
+
+class FailingDriver(FakeDriver):
+
+    '''
+    Fake browser failing to open the result page of a keyword.
+    '''
+
+    def __init__(self, page_source, failing_keyword, **kwargs):
+
+        super().__init__(page_source, **kwargs)
+        self.failing_keyword = failing_keyword
+        self.crashed = False
+        self.quit_calls = 0
+
+    def get(self, url):
+
+        # A crashed browser fails again, so reusing it would count another harvest error
+        if self.crashed or 'q={}&'.format(self.failing_keyword) in url:
+            self.crashed = True
+            raise RuntimeError('Browser crashed')
+        super().get(url)
+
+    def quit(self):
+
+        self.quit_calls += 1
+
+
+def test_acquire_reuses_the_driver():
+
+    factory = DriverFactory()
+    pool = BrowserPool(factory)
+
+    with pool.acquire() as first_driver:
+        pass
+    with pool.acquire() as second_driver:
+        pass
+
+    assert first_driver is second_driver
+    assert len(factory.drivers) == 1
+
+
+def test_acquire_discards_the_driver_after_an_error():
+
+    factory = DriverFactory()
+    pool = BrowserPool(factory)
+
+    with pytest.raises(RuntimeError):
+        with pool.acquire() as failed_driver:
+            raise RuntimeError('Browser crashed')
+
+    with pool.acquire() as driver:
+        pass
+
+    assert failed_driver.quit_calls == 1
+    assert driver is not failed_driver
+    assert pool.all_drivers == [driver]
+
+
+def test_acquire_keeps_the_driver_of_a_closed_generator():
+
+    factory = DriverFactory()
+    pool = BrowserPool(factory)
+
+    def urls():
+        with pool.acquire():
+            yield 'https://example.com/0.jpg'
+            yield 'https://example.com/1.jpg'
+
+    image_urls = urls()
+    next(image_urls)
+    image_urls.close()
+
+    assert factory.drivers[0].quit_calls == 0
+    assert pool.idle_drivers == factory.drivers
+
+
+def test_acquire_is_bounded_by_the_pool_size():
+
+    factory = DriverFactory()
+    pool = BrowserPool(factory, size=2)
+    acquired = threading.Event()
+    drivers = []
+
+    def acquire():
+        with pool.acquire() as driver:
+            drivers.append(driver)
+            acquired.set()
+
+    with pool.acquire(), pool.acquire():
+        worker = threading.Thread(target=acquire)
+        worker.start()
+        # Both drivers are in use, the third worker waits
+        assert not acquired.wait(0.2)
+
+    worker.join(5)
+
+    assert acquired.is_set()
+    assert drivers[0] in factory.drivers
+    assert len(factory.drivers) == 2
+
+
+def test_acquire_restarts_a_driver_failing_the_health_check():
+
+    factory = DriverFactory()
+    pool = BrowserPool(factory, health_check=lambda driver: driver.number != 0)
+
+    with pool.acquire() as dead_driver:
+        pass
+    with pool.acquire() as driver:
+        pass
+
+    assert dead_driver.quit_calls == 1
+    assert driver is factory.drivers[1]
+    assert pool.restarts == 1
+    assert pool.all_drivers == [driver]
+
+
+def test_a_failing_keyword_does_not_stop_the_others(tmp_path):
+
+    server = ImageServer().start()
+    drivers = []
+
+    def driver_factory():
+        drivers.append(FailingDriver(make_result_page([server.url(number) for number in range(10)]), 'bird'))
+        return drivers[-1]
+
+    try:
+        easy_images = EasyImages(driver_factory=driver_factory, loading_timeout=0.2)
+        stats = easy_images.download('dog, bird, cat', output_dir=str(tmp_path), max_limit=3, url_extraction='page_data',
+                                     browsers=2, verbose=False)
+    finally:
+        server.stop()
+
+    assert stats.keywords['dog'].counts['Final'] == 3
+    assert stats.keywords['cat'].counts['Final'] == 3
+    assert stats.keywords['bird'].counts['Final'] == 0
+    assert stats.failures['harvest_error'] == 1
+    assert len(os.listdir(str(tmp_path / 'dog'))) == 4
+
+    # The browser of the failed keyword is quit (and replaced if needed), the others are quit once at the end
+    assert [driver.quit_calls for driver in drivers] == [1] * len(drivers)
+    assert 2 <= len(drivers) <= 3
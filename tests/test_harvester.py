@@ -0,0 +1,359 @@
+import os
+import threading
+
+from easy_images.harvester import GoogleImagesHarvester, extract_image_urls, wait_until
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Full resolution urls of the result page fixture, in page order
+RESULT_PAGE_URLS = [
+    'https://upload.wikimedia.org/wikipedia/commons/thumb/4/43/Cute_dog.jpg/1200px-Cute_dog.jpg',
+    'https://images.example-cdn.com/photo?id=123&w=1200',
+    'http://example.org/b\u00fccher/hund.jpg',
+    'https://cdn.example.net/pets/dog%20running.png?v=2',
+]
+
+
+class FakeClock:
+
+    '''
+    Clock and sleep of the waits: sleeping advances the clock, so tests never wait.
+    '''
+
+    def __init__(self):
+
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+
+        return self.now
+
+    def sleep(self, seconds):
+
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeElement:
+
+    def __init__(self, driver, kind, index=None):
+
+        self.driver = driver
+        self.kind = kind
+        self.index = index
+
+    def send_keys(self, *keys):
+
+        self.driver.scrolls += 1
+        self.driver._load_next(self.driver.batches)
+
+    def click(self):
+
+        if self.kind == 'more':
+            self.driver.more_clicks += 1
+            self.driver._load_next(self.driver.more_batches)
+        else:
+            self.driver.clicks.append(self.index)
+            self.driver.selected = self.index
+
+    def get_attribute(self, name):
+
+        return self.driver.image_urls[self.driver.selected]
+
+    def is_displayed(self):
+
+        return True
+
+
+class FakeResultPage:
+
+    def __init__(self, clock, batches, more_batches=(), delay=0.2, image_urls=None, page_source='<html></html>'):
+
+        '''
+        Fake WebDriver of a result page. Opening the page and every scroll load the next batch of
+        thumbnails, delay (fake) seconds later. Once the batches run out, a visible "Show more
+        results" button loads the more_batches. A clicked thumbnail previews its image url.
+        '''
+
+        self.clock = clock
+        self.batches = list(batches)
+        self.more_batches = list(more_batches)
+        self.delay = delay
+        self.image_urls = image_urls or []
+        self.page_source = page_source
+
+        self.pending = []
+        self.count = 0
+        self.scrolls = 0
+        self.more_clicks = 0
+        self.clicks = []
+        self.selected = None
+
+    def _load_next(self, batches):
+
+        if batches: self.pending.append((self.clock() + self.delay, batches.pop(0)))
+
+    def _thumbnail_count(self):
+
+        for loaded_at, count in list(self.pending):
+            if loaded_at <= self.clock():
+                self.pending.remove((loaded_at, count))
+                self.count += count
+
+        return self.count
+
+    def get(self, url):
+
+        self._load_next(self.batches)
+
+    def find_element(self, by, value):
+
+        return FakeElement(self, 'page')
+
+    def find_elements(self, by, value):
+
+        if value == GoogleImagesHarvester.THUMBNAIL_SELECTOR:
+            return [FakeElement(self, 'thumbnail', index) for index in range(self._thumbnail_count())]
+        if value == GoogleImagesHarvester.PREVIEW_SELECTOR:
+            return [FakeElement(self, 'preview')] if self.selected is not None else []
+        if value == GoogleImagesHarvester.SHOW_MORE_CLASS:
+            return [FakeElement(self, 'more')] if self.more_batches and not self.batches and not self.pending else []
+        return []
+
+
+def read_fixture(name):
+
+    with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as file:
+        return file.read()
+
+
+def make_harvester(page, clock, **kwargs):
+
+    kwargs.setdefault('page_loading_timeout', 1.0)
+    kwargs.setdefault('preview_timeout', 0.5)
+
+    return GoogleImagesHarvester(page, poll_interval=0.1, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_wait_until_returns_the_first_truthy_result():
+
+    clock = FakeClock()
+    results = iter([0, [], 'ready', 'later'])
+
+    assert wait_until(lambda: next(results), timeout=5, poll_interval=0.1, clock=clock, sleep=clock.sleep) == 'ready'
+    assert clock.sleeps == [0.1, 0.1]
+
+
+def test_wait_until_times_out_with_the_last_result():
+
+    clock = FakeClock()
+    calls = []
+
+    def condition():
+        calls.append(clock())
+        return []
+
+    assert wait_until(condition, timeout=1, poll_interval=0.25, clock=clock, sleep=clock.sleep) == []
+    assert calls == [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def test_wait_until_without_timeout_polls_once():
+
+    clock = FakeClock()
+
+    assert not wait_until(lambda: False, timeout=0, clock=clock, sleep=clock.sleep)
+    assert clock.sleeps == []
+
+
+def test_load_waits_for_the_first_thumbnails():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [10], delay=0.3)
+
+    assert make_harvester(page, clock).load('https://www.google.com/search?q=dog')
+    assert 0.3 <= clock.now < 0.5
+
+
+def test_load_gives_up_without_thumbnails():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [])
+
+    assert not make_harvester(page, clock).load('https://www.google.com/search?q=dog')
+    assert clock.now >= 1.0
+
+
+def test_scroll_stops_once_the_target_is_loaded():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [10, 10, 10, 10, 10])
+    harvester = make_harvester(page, clock)
+    harvester.load('https://www.google.com/search?q=dog')
+
+    assert harvester.scroll(25) == 30
+    assert page.scrolls == 2
+
+
+def test_scroll_stops_when_the_count_plateaus():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [10, 10])
+    harvester = make_harvester(page, clock)
+    harvester.load('https://www.google.com/search?q=dog')
+    start_time = clock.now
+
+    assert harvester.scroll(100) == 20
+    # One scroll grows the page, the next one waits a full timeout for nothing and ends the scrolling
+    assert page.scrolls == 2
+    assert clock.now - start_time >= 1.0
+
+
+def test_scroll_clicks_show_more_on_a_plateau():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [10], more_batches=[15])
+    harvester = make_harvester(page, clock)
+    harvester.load('https://www.google.com/search?q=dog')
+
+    assert harvester.scroll(100) == 25
+    assert page.more_clicks == 1
+
+
+def test_scroll_is_bounded_by_max_scroll_number():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [1] * 50)
+    harvester = make_harvester(page, clock, max_scroll_number=3)
+    harvester.load('https://www.google.com/search?q=dog')
+
+    assert harvester.scroll(100) == 4
+    assert page.scrolls == 3
+
+
+def test_iter_image_urls_without_stop_event_collects_the_surplus():
+
+    clock = FakeClock()
+    image_urls = ['https://example.com/{}.jpg'.format(number) for number in range(20)]
+    page = FakeResultPage(clock, [20], image_urls=image_urls)
+    harvester = make_harvester(page, clock, extraction='click', url_surplus_factor=1.5)
+
+    # max_limit * url_surplus_factor + 1 urls
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 4)) == image_urls[:7]
+    assert page.clicks == list(range(7))
+
+
+def test_iter_image_urls_stops_clicking_once_the_stop_event_is_set():
+
+    clock = FakeClock()
+    image_urls = ['https://example.com/{}.jpg'.format(number) for number in range(20)]
+    page = FakeResultPage(clock, [20], image_urls=image_urls)
+    harvester = make_harvester(page, clock, extraction='click')
+    stop_event = threading.Event()
+    harvested_urls = []
+
+    for image_url in harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 2, stop_event):
+        harvested_urls.append(image_url)
+        if len(harvested_urls) == 3: stop_event.set()
+
+    assert harvested_urls == image_urls[:3]
+    assert page.clicks == [0, 1, 2]
+
+
+def test_iter_image_urls_goes_past_the_surplus_with_a_stop_event():
+
+    clock = FakeClock()
+    image_urls = ['https://example.com/{}.jpg'.format(number) for number in range(20)]
+    page = FakeResultPage(clock, [20], image_urls=image_urls)
+    harvester = make_harvester(page, clock, extraction='click')
+
+    # The consumer decides when to stop, e.g. after many failed downloads
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 2, threading.Event())) == image_urls
+
+
+def test_iter_image_urls_with_a_set_stop_event_yields_nothing():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [20], image_urls=['https://example.com/{}.jpg'.format(number) for number in range(20)])
+    harvester = make_harvester(page, clock, extraction='click')
+    stop_event = threading.Event()
+    stop_event.set()
+
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 2, stop_event)) == []
+    assert page.clicks == []
+
+
+def test_iter_image_urls_skips_thumbnails_without_a_new_preview():
+
+    clock = FakeClock()
+    image_urls = ['https://example.com/0.jpg', 'https://example.com/0.jpg', 'https://example.com/2.jpg']
+    page = FakeResultPage(clock, [3], image_urls=image_urls)
+    harvester = make_harvester(page, clock, extraction='click')
+
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 10)) == [image_urls[0], image_urls[2]]
+    assert page.clicks == [0, 1, 2]
+
+
+def test_iter_image_urls_without_thumbnails_yields_nothing():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [])
+    harvester = make_harvester(page, clock)
+
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 10)) == []
+
+
+def test_extract_image_urls_from_a_result_page():
+
+    # Thumbnails, Google hosted images and source page links are not image urls; escapes are decoded
+    assert extract_image_urls(read_fixture('google_images_result_page.html')) == RESULT_PAGE_URLS
+
+
+def test_extract_image_urls_from_a_legacy_result_page():
+
+    assert extract_image_urls(read_fixture('google_images_legacy_result_page.html')) == [
+        'https://example.com/cats/tabby.jpg',
+        'https://pets.example.org/image?name=kitten&size=large',
+    ]
+
+
+def test_extract_image_urls_without_result_data():
+
+    assert extract_image_urls('<html><body id="yDmH0d"><img class="rg_i Q4LuWd" src="data:image/gif;base64,R0lGODlh"></body></html>') == []
+
+
+def test_iter_image_urls_reads_the_page_data_without_clicking():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [4], page_source=read_fixture('google_images_result_page.html'))
+    harvester = make_harvester(page, clock, extraction='page_data')
+
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 10)) == RESULT_PAGE_URLS
+    assert page.clicks == []
+
+
+def test_iter_image_urls_stops_reading_the_page_data_on_the_stop_event():
+
+    clock = FakeClock()
+    page = FakeResultPage(clock, [4], page_source=read_fixture('google_images_result_page.html'))
+    harvester = make_harvester(page, clock, extraction='auto')
+    stop_event = threading.Event()
+    harvested_urls = []
+
+    for image_url in harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 10, stop_event):
+        harvested_urls.append(image_url)
+        if len(harvested_urls) == 2: stop_event.set()
+
+    assert harvested_urls == RESULT_PAGE_URLS[:2]
+    assert page.clicks == []
+
+
+def test_iter_image_urls_clicks_only_the_thumbnails_after_the_page_data():
+
+    clock = FakeClock()
+    image_urls = ['https://example.com/{}.jpg'.format(number) for number in range(6)]
+    page = FakeResultPage(clock, [6], image_urls=image_urls, page_source=read_fixture('google_images_result_page.html'))
+    harvester = make_harvester(page, clock, extraction='auto')
+
+    assert list(harvester.iter_image_urls('https://www.google.com/search?q=dog', 'dog', 10)) == RESULT_PAGE_URLS + image_urls[4:]
+    assert page.clicks == [4, 5]
@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed for downloading, post processing processes must never load them
+DOWNLOAD_MODULES = ('selenium', 'webdriver_manager', 'requests', 'magic', 'tabulate')
+
+SCRIPT = '''
+import json, sys
+from easy_images.easy_images import EasyImages
+from easy_images.stats import failure_reason
+{statement}
+print(json.dumps(sorted(set(name.split('.')[0] for name in sys.modules))))
+'''
+
+
+def loaded_modules(statement, cwd):
+
+    '''
+    Top-level modules loaded by a fresh interpreter after importing EasyImages and running the statement.
+    '''
+
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, environment.get('PYTHONPATH')]))
+
+    output = subprocess.run([sys.executable, '-c', SCRIPT.format(statement=statement)], env=environment, cwd=cwd,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+    return set(json.loads(output.stdout.decode('utf-8').strip().splitlines()[-1]))
+
+
+@pytest.fixture
+def image_dir(tmp_path):
+
+    image_dir = tmp_path / 'images'
+    image_dir.mkdir()
+    rng = np.random.default_rng(0)
+
+    for number in range(4):
+        image = rng.integers(0, 256, (32, 32, 3), dtype=np.uint8)
+        cv2.imwrite(str(image_dir / 'image_{}.jpg'.format(number)), image)
+    # A copy, so post processing removes a duplicate
+    cv2.imwrite(str(image_dir / 'image_4.jpg'), cv2.imread(str(image_dir / 'image_0.jpg')))
+
+    return image_dir
+
+
+@pytest.mark.parametrize('statement', [
+    '',
+    'EasyImages()',
+    # Post processing gets the reason of a file it can not remove
+    'failure_reason(OSError("Read-only file system"))',
+], ids=['import', 'construct', 'failure_reason'])
+def test_no_download_modules_are_loaded(statement, tmp_path):
+
+    loaded = loaded_modules(statement, str(tmp_path))
+
+    assert 'easy_images' in loaded
+    assert not loaded.intersection(DOWNLOAD_MODULES)
+
+
+def test_post_processing_loads_no_download_modules(image_dir, tmp_path):
+
+    statement = 'EasyImages().post_processing({!r}, remove_duplicates=True, resize=(16, 16), avg_image_size=True)'.format(str(image_dir))
+    loaded = loaded_modules(statement, str(tmp_path))
+
+    assert not loaded.intersection(DOWNLOAD_MODULES)
+    assert len(os.listdir(image_dir)) == 4